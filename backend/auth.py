@@ -3,24 +3,69 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import os
 from typing import Optional
 from models import User, UserCreate, UserLogin
 from database import db
+from cache import TTLCache
 
 # Security configuration
 SECRET_KEY = os.environ.get("JWT_SECRET", "riide_secret_key_2025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; each increment doubles the work per hash
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# Password hashing runs on its own pool so it never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashing requests allowed in flight (running plus queued) before shedding load
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                       thread_name_prefix="password-hash")
+_password_jobs_in_flight = 0
+
+# Authenticated users by id, so each request doesn't reload its user
+principal_cache = TTLCache(
+    ttl=float(os.environ.get("PRINCIPAL_CACHE_TTL", "60")),
+    max_entries=int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+)
+# Digests of tokens that recently failed validation
+rejected_token_cache = TTLCache(ttl=30, max_entries=10000)
+
+def invalidate_principal(user_id: str):
+    principal_cache.pop(user_id)
+
+db.on_change("users", invalidate_principal)
+
+async def run_password_job(func, *args):
+    """Run a bcrypt call on the password pool, shedding load when the queue is full"""
+    global _password_jobs_in_flight
+    if _password_jobs_in_flight >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+    
+    _password_jobs_in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs_in_flight -= 1
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_password_job(pwd_context.verify, plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await run_password_job(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -40,27 +85,39 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    token = credentials.credentials
+    token_digest = hashlib.sha256(token.encode()).digest()
+    if rejected_token_cache.get(token_digest):
+        raise credentials_exception
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
+        user_id = None
+    if user_id is None:
+        rejected_token_cache.set(token_digest, True)
         raise credentials_exception
     
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+    
     user_data = await db.get_user_by_id(user_id)
     if user_data is None:
+        rejected_token_cache.set(token_digest, True)
         raise credentials_exception
     
-    return User(**user_data)
+    user = User(**user_data)
+    principal_cache.set(user_id, user)
+    return user
 
 async def authenticate_user(email: str, password: str) -> Optional[User]:
     user_data = await db.get_user_by_email(email)
     if not user_data:
         return None
     
-    if not verify_password(password, user_data["password_hash"]):
+    if not await verify_password(password, user_data["password_hash"]):
         return None
     
     # Remove password hash before returning user
@@ -77,7 +134,7 @@ async def create_user_account(user_create: UserCreate) -> User:
         )
     
     # Hash password and create user
-    hashed_password = get_password_hash(user_create.password)
+    hashed_password = await get_password_hash(user_create.password)
     
     user_data = user_create.dict()
     user_data.pop("password")  # Remove plain password
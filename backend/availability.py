@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Booking statuses that no longer hold a vehicle
+RELEASED_STATUSES = ("cancelled", "completed")
+
+# Booking fields booking_window needs, plus what the index keys on
+WINDOW_FIELDS = ["id", "vehicle_id", "status", "pickup_date", "pickup_time",
+                 "return_date", "return_time"]
+
+# How long a chauffeur booking (no return date) blocks its vehicle
+CHAUFFEUR_BLOCK = timedelta(hours=1)
+
+def as_date(value: Any) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def as_time(value: Any) -> time:
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+def booking_window(booking: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    """[start, end) a booking occupies its vehicle for.
+
+    Dates and times may be native values or the ISO strings they are stored
+    as. Rentals run until return_date/return_time (pickup time if no return
+    time is given); chauffeur bookings block CHAUFFEUR_BLOCK from pickup.
+    """
+    pickup_time = as_time(booking.get("pickup_time")) or time(0, 0)
+    start = datetime.combine(as_date(booking["pickup_date"]), pickup_time)
+    if booking.get("return_date"):
+        return_time = as_time(booking.get("return_time")) or pickup_time
+        end = datetime.combine(as_date(booking["return_date"]), return_time)
+    else:
+        end = start + CHAUFFEUR_BLOCK
+    return start, max(end, start + timedelta(minutes=1))
+
+class IntervalIndex:
+    """Booked windows of one vehicle, answering "is [start, end) free?" in O(log n).
+
+    Windows are kept sorted by start alongside a running maximum of their
+    ends. A query window overlaps something iff, among the windows starting
+    before its end, the largest end is after its start, which is one bisect
+    and one lookup. That holds even if stored windows overlap each other, as
+    bookings made before conflict checks existed may.
+    """
+
+    __slots__ = ("_windows", "_max_ends")
+
+    def __init__(self):
+        self._windows: List[Tuple[datetime, datetime, str]] = []
+        self._max_ends: List[datetime] = []
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _rebuild_from(self, position: int):
+        running = self._max_ends[position - 1] if position > 0 else None
+        del self._max_ends[position:]
+        for _, end, _ in self._windows[position:]:
+            running = end if running is None or end > running else running
+            self._max_ends.append(running)
+
+    def add(self, start: datetime, end: datetime, key: str):
+        window = (start, end, key)
+        insort(self._windows, window)
+        self._rebuild_from(bisect_left(self._windows, window))
+
+    def remove(self, key: str) -> bool:
+        for position, (_, _, window_key) in enumerate(self._windows):
+            if window_key == key:
+                del self._windows[position]
+                self._rebuild_from(position)
+                return True
+        return False
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        position = bisect_left(self._windows, (end,)) - 1
+        return position >= 0 and self._max_ends[position] > start
+
+class AvailabilityIndex:
+    """In-memory calendar of which vehicles are booked when.
+
+    Holds every in-service vehicle and an IntervalIndex per vehicle built
+    from its active bookings, kept in sync through db.on_change for both
+    collections. A category search costs O(vehicles x log bookings) with no
+    database reads, and create_booking checks and reserves a vehicle without
+    yielding to the event loop, so two requests in this process cannot take
+    the same slot.
+    """
+
+    def __init__(self):
+        self._vehicles: Dict[str, Dict[str, Any]] = {}
+        self._calendars: Dict[str, IntervalIndex] = {}
+        self._booking_vehicles: Dict[str, str] = {}
+        self._loaded = False
+        # Strong references so pending refreshes are not garbage collected
+        self._refreshes: Set[asyncio.Task] = set()
+
+    async def load(self):
+        vehicles, bookings = await asyncio.gather(
+            db.find_documents("vehicles", {"available": True}, limit=0),
+            db.find_documents("bookings", {
+                "vehicle_id": {"$ne": None},
+                "status": {"$nin": list(RELEASED_STATUSES)}
+            }, limit=0, fields=WINDOW_FIELDS)
+        )
+        self._vehicles = {vehicle["id"]: vehicle for vehicle in vehicles}
+        self._calendars = {}
+        self._booking_vehicles = {}
+        for booking in bookings:
+            self._track(booking)
+        self._loaded = True
+
+    def _track(self, booking: Dict[str, Any]):
+        self.release(booking["id"])
+        vehicle_id = booking.get("vehicle_id")
+        if not vehicle_id or booking.get("status") in RELEASED_STATUSES:
+            return
+        start, end = booking_window(booking)
+        self.reserve(vehicle_id, booking["id"], start, end)
+
+    def reserve(self, vehicle_id: str, booking_id: str, start: datetime, end: datetime):
+        self._calendars.setdefault(vehicle_id, IntervalIndex()).add(start, end, booking_id)
+        self._booking_vehicles[booking_id] = vehicle_id
+
+    def release(self, booking_id: str):
+        vehicle_id = self._booking_vehicles.pop(booking_id, None)
+        if vehicle_id is not None:
+            self._calendars[vehicle_id].remove(booking_id)
+
+    def is_free(self, vehicle_id: str, start: datetime, end: datetime) -> bool:
+        calendar = self._calendars.get(vehicle_id)
+        return calendar is None or not calendar.overlaps(start, end)
+
+    def get_vehicle(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        return self._vehicles.get(vehicle_id)
+
+    def fleet_size(self, vehicle_type: str) -> int:
+        return sum(1 for vehicle in self._vehicles.values() if vehicle.get("type") == vehicle_type)
+
+    def free_vehicles(self, start: datetime, end: datetime, category: Optional[str] = None,
+                      vehicle_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """In-service vehicles, optionally of a category and type, with no booking in [start, end)"""
+        return [
+            vehicle for vehicle in self._vehicles.values()
+            if (category is None or vehicle.get("category") == category)
+            and (vehicle_type is None or vehicle.get("type") == vehicle_type)
+            and self.is_free(vehicle["id"], start, end)
+        ]
+
+    async def refresh_vehicle(self, vehicle_id: str):
+        vehicle = await db.get_document("vehicles", vehicle_id)
+        if vehicle and vehicle.get("available", True):
+            self._vehicles[vehicle_id] = vehicle
+        else:
+            self._vehicles.pop(vehicle_id, None)
+
+    async def refresh_booking(self, booking_id: str):
+        booking = await db.get_document("bookings", booking_id, fields=WINDOW_FIELDS)
+        if booking:
+            self._track(booking)
+        else:
+            self.release(booking_id)
+
+    def _schedule(self, refresh: Awaitable[None]):
+        task = asyncio.ensure_future(refresh)
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Availability index refresh failed; index may be stale until reload",
+                         exc_info=task.exception())
+
+    def on_vehicle_change(self, vehicle_id: str):
+        if self._loaded:
+            self._schedule(self.refresh_vehicle(vehicle_id))
+
+    def on_booking_change(self, booking_id: str):
+        if self._loaded:
+            self._schedule(self.refresh_booking(booking_id))
+
+# Global availability index instance
+vehicle_availability = AvailabilityIndex()
+db.on_change("vehicles", vehicle_availability.on_vehicle_change)
+db.on_change("bookings", vehicle_availability.on_booking_change)
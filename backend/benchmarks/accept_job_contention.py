@@ -0,0 +1,95 @@
+"""Contention benchmark for job acceptance.
+
+N concurrent drivers race to accept M requested bookings. Each driver keeps
+trying random open jobs until every job has been claimed. The report shows
+claim throughput, claim latency and, most importantly, how many jobs ended
+up with more than one "winner".
+
+Run from the backend directory against a scratch database:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=riide_bench \\
+        python -m benchmarks.accept_job_contention --drivers 200 --jobs 50
+
+Pass --legacy to measure the old unconditional update + reread path.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from database import db
+
+BENCHMARK_TAG = "accept_job_contention"
+
+async def legacy_claim(booking_id: str, driver_id: str):
+    """The previous accept-job flow: unconditional update, then reread"""
+    updated = await db.update_document("bookings", booking_id, {
+        "driver_id": driver_id,
+        "status": "driver_assigned",
+        "started_at": datetime.utcnow()
+    })
+    if not updated:
+        return None
+    return await db.get_document("bookings", booking_id)
+
+async def create_jobs(count: int) -> list:
+    job_ids = [str(uuid.uuid4()) for _ in range(count)]
+    await db.db.bookings.insert_many([
+        {"id": job_id, "status": "requested", "benchmark": BENCHMARK_TAG}
+        for job_id in job_ids
+    ])
+    return job_ids
+
+async def driver_worker(driver_id: str, open_jobs: set, wins: Counter,
+                        latencies: list, legacy: bool):
+    claim = legacy_claim if legacy else db.claim_booking
+    while open_jobs:
+        booking_id = random.choice(tuple(open_jobs))
+        start = time.perf_counter()
+        booking = await claim(booking_id, driver_id)
+        latencies.append(time.perf_counter() - start)
+        if booking:
+            wins[booking_id] += 1
+            open_jobs.discard(booking_id)
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def run(drivers: int, jobs: int, legacy: bool):
+    await db.connect()
+    try:
+        job_ids = await create_jobs(jobs)
+        open_jobs, wins, latencies = set(job_ids), Counter(), []
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            driver_worker(f"bench-driver-{i}", open_jobs, wins, latencies, legacy)
+            for i in range(drivers)
+        ))
+        elapsed = time.perf_counter() - start
+
+        double_wins = sum(1 for count in wins.values() if count > 1)
+        print(f"mode:            {'legacy' if legacy else 'conditional'}")
+        print(f"drivers / jobs:  {drivers} / {jobs}")
+        print(f"claim attempts:  {len(latencies)} in {elapsed:.2f}s "
+              f"({len(latencies) / elapsed:.0f}/s)")
+        print(f"latency p50/p95/p99: "
+              f"{percentile(latencies, 0.50) * 1000:.1f} / "
+              f"{percentile(latencies, 0.95) * 1000:.1f} / "
+              f"{percentile(latencies, 0.99) * 1000:.1f} ms")
+        print(f"jobs with more than one winner: {double_wins}")
+    finally:
+        await db.db.bookings.delete_many({"benchmark": BENCHMARK_TAG})
+        await db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.drivers, args.jobs, args.legacy))
@@ -0,0 +1,39 @@
+"""Minimal in-process ASGI client shared by the benchmarks"""
+import json
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+async def call_asgi(app, method: str, path: str, json_body: Any = None,
+                    headers: Optional[Dict[str, str]] = None,
+                    params: Optional[Dict[str, Any]] = None) -> Tuple[int, bytes]:
+    """Issue one HTTP request against an ASGI app and return (status, body)"""
+    body = json.dumps(json_body).encode() if json_body is not None else b""
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    if json_body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(), "root_path": "",
+        "headers": raw_headers, "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    status, chunks, sent = 500, [], False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
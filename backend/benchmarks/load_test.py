@@ -0,0 +1,224 @@
+"""End-to-end load harness for the FastAPI app.
+
+Drives server.app in-process through its ASGI interface with a weighted mix
+of realistic requests and reports throughput plus p50/p95/p99 latency and
+status counts per route. Before the run it seeds the initial content and a
+synthetic population of users, drivers and requested bookings.
+
+Against a local mongod (use a scratch database, it is written to):
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=riide_load \\
+        python -m benchmarks.load_test --mix mixed --duration 30 --concurrency 50
+
+Against the in-memory Motor stand-in (pip install -r requirements-dev.txt). Index,
+geo and explain behaviour is not modelled, so use it for app-side costs.
+mongomock re-reads find_one_and_update results with the original filter, so
+accept-job answers 409 there even for a winning claim:
+
+    python -m benchmarks.load_test --in-memory --mix landing
+
+Mixes: landing, booking, driver, mixed. BCRYPT_ROUNDS also applies to the
+synthetic users, so lower it to load-test everything except bcrypt.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from benchmarks.asgi import call_asgi
+
+# Relative weights of each route per traffic mix
+MIXES = {
+    "landing": {
+        "GET /api/services": 3, "GET /api/vehicles": 3, "GET /api/testimonials": 2,
+        "GET /api/blog/posts": 2, "GET /api/faqs": 2, "GET /api/locations": 1,
+    },
+    "booking": {
+        "POST /api/auth/login": 1, "POST /api/pricing/calculate": 10,
+        "POST /api/bookings": 2, "GET /api/bookings": 2,
+    },
+    "driver": {
+        "PUT /api/drivers/location": 20, "POST /api/drivers/accept-job": 2,
+        "GET /api/drivers/current-job": 2,
+    },
+    "mixed": {
+        "GET /api/services": 6, "GET /api/vehicles": 6, "GET /api/testimonials": 3,
+        "GET /api/blog/posts": 3, "GET /api/faqs": 3, "POST /api/auth/login": 1,
+        "POST /api/pricing/calculate": 8, "POST /api/bookings": 2,
+        "PUT /api/drivers/location": 15, "POST /api/drivers/accept-job": 2,
+    },
+}
+
+VEHICLE_TYPES = ["Economy", "Premium", "SUV", "Van"]
+EXTRAS = ["childSeat", "meetGreet", "luggage", "wifi"]
+PAYMENT_METHODS = ["icp", "usdt", "btc", "eth", "card"]
+
+class Population:
+    """Synthetic accounts and jobs the traffic generator draws from"""
+
+    def __init__(self, data: dict):
+        from auth import create_access_token
+
+        self.emails = [user["email"] for user in data["users"]]
+        self.rider_tokens = [create_access_token(data={"sub": user["id"]})
+                             for user in data["users"][:500]]
+        self.driver_tokens = [create_access_token(data={"sub": driver["user_id"]})
+                              for driver in data["drivers"]]
+        self.requested_jobs = [booking["id"] for booking in data["bookings"]
+                               if booking["status"] == "requested"]
+
+def auth_header(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+def build_request(route: str, population: Population, rng: random.Random):
+    """(method, path, json_body, headers, params) for one request to route"""
+    from seed_data import SYNTHETIC_CENTER, SYNTHETIC_PASSWORD
+
+    method, path = route.split(" ", 1)
+    if route == "GET /api/blog/posts":
+        return method, path, None, None, {"limit": 3}
+    if route == "POST /api/auth/login":
+        return method, path, {"email": rng.choice(population.emails),
+                              "password": SYNTHETIC_PASSWORD}, None, None
+    if route == "POST /api/pricing/calculate":
+        return method, path, {
+            "vehicle_type": rng.choice(VEHICLE_TYPES),
+            "service_type": rng.choice(["chauffeur", "rental"]),
+            "duration_hours": rng.randint(1, 8),
+            "duration_days": rng.randint(1, 7),
+            "extras": rng.sample(EXTRAS, rng.randint(0, 2)),
+            "payment_method": rng.choice(PAYMENT_METHODS),
+        }, None, None
+    if route == "POST /api/bookings":
+        pickup = date.today() + timedelta(days=rng.randint(1, 30))
+        return method, path, {
+            "pickup_location": "San Francisco International Airport",
+            "destination": "Union Square",
+            "pickup_date": pickup.isoformat(),
+            "pickup_time": f"{rng.randint(0, 23):02d}:30:00",
+            "passengers": rng.randint(1, 4),
+            "vehicle_type": rng.choice(VEHICLE_TYPES),
+            "extras": rng.sample(EXTRAS, rng.randint(0, 2)),
+            "payment_method": rng.choice(PAYMENT_METHODS),
+        }, auth_header(rng.choice(population.rider_tokens)), None
+    if route == "GET /api/bookings":
+        return method, path, None, auth_header(rng.choice(population.rider_tokens)), None
+    if route == "PUT /api/drivers/location":
+        lat, lng = SYNTHETIC_CENTER
+        return method, path, {"current_lat": lat + rng.uniform(-0.1, 0.1),
+                              "current_lng": lng + rng.uniform(-0.1, 0.1)}, \
+            auth_header(rng.choice(population.driver_tokens)), None
+    if route == "POST /api/drivers/accept-job":
+        booking_id = rng.choice(population.requested_jobs) if population.requested_jobs else "none"
+        return method, path, {"booking_id": booking_id}, \
+            auth_header(rng.choice(population.driver_tokens)), None
+    if route == "GET /api/drivers/current-job":
+        return method, path, None, auth_header(rng.choice(population.driver_tokens)), None
+    return method, path, None, None, None
+
+async def start_app(in_memory: bool, users: int, drivers: int, bookings: int) -> Population:
+    """Bring the app up the way its startup hook does and load the population"""
+    import seed_data
+    import server
+    from bson import BSON
+    from database import db, CODEC_OPTIONS
+
+    if in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install -r requirements-dev.txt")
+        import mongomock.collection
+
+        class CodecBSON(BSON):
+            """mongomock validates inserts with default codecs; use ours instead"""
+
+            @classmethod
+            def encode(cls, document, check_keys=False, codec_options=CODEC_OPTIONS):
+                return super().encode(document, check_keys, codec_options)
+
+        # mongomock rejects custom type registries on the database handle but
+        # keeps Python values as-is, so only its insert validation needs them
+        mongomock.collection.BSON = CodecBSON
+        # with_options() would hand back a synchronous mongomock collection;
+        # write concerns mean nothing in memory, so keep the async wrapper
+        AsyncMongoMockCollection.with_options = lambda self, **kwargs: self
+        db.client = AsyncMongoMockClient()
+        db.db = db.client.get_database(os.environ.get("DB_NAME", "riide_load"))
+        await seed_data.seed_database()
+        await server.pricing_engine.load()
+        await server.location_index.load()
+        await server.vehicle_availability.load()
+        await server.trip_tracker.load()
+        server.location_store.start()
+    else:
+        await server.startup_db()
+
+    data = seed_data.generate_synthetic_data(users=users, drivers=drivers, bookings=bookings,
+                                             reward_transactions=0)
+    for collection, documents in data.items():
+        if in_memory:
+            # Store what a real server would: enums as strings, dates via the codecs
+            documents = [BSON.encode(doc, codec_options=CODEC_OPTIONS).decode()
+                         for doc in documents]
+        await db.create_documents(collection, documents)
+    return Population(data)
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def run(args):
+    import server
+
+    population = await start_app(args.in_memory, args.users, args.drivers, args.bookings)
+    weights = MIXES[args.mix]
+    routes, route_weights = list(weights), list(weights.values())
+    latencies, statuses = defaultdict(list), defaultdict(Counter)
+    deadline = time.perf_counter() + args.duration
+
+    async def virtual_user(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            route = rng.choices(routes, route_weights)[0]
+            method, path, body, headers, params = build_request(route, population, rng)
+            start = time.perf_counter()
+            status, _ = await call_asgi(server.app, method, path, json_body=body,
+                                        headers=headers, params=params)
+            latencies[route].append(time.perf_counter() - start)
+            statuses[route][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"mix: {args.mix}   concurrency: {args.concurrency}   "
+          f"{total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s)")
+    print(f"{'route':<32}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for route in routes:
+        values = latencies.get(route)
+        if not values:
+            continue
+        codes = " ".join(f"{code}:{count}" for code, count in sorted(statuses[route].items()))
+        print(f"{route:<32}{len(values) / elapsed:>8.0f}"
+              f"{percentile(values, 0.50) * 1000:>9.1f}"
+              f"{percentile(values, 0.95) * 1000:>9.1f}"
+              f"{percentile(values, 0.99) * 1000:>9.1f}  {codes}")
+
+    await server.shutdown_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--bookings", type=int, default=2000)
+    asyncio.run(run(parser.parse_args()))
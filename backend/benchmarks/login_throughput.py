@@ -0,0 +1,75 @@
+"""Login throughput benchmark for password verification.
+
+Fires concurrent bcrypt verifications, as a burst of logins would, while a
+probe coroutine measures how late the event loop wakes it up. The probe
+stands in for unrelated requests such as location pings: with blocking
+bcrypt its lag grows by the cost of every hash, with the password pool it
+stays near zero.
+
+Needs no database. Run from the backend directory:
+
+    python -m benchmarks.login_throughput --logins 200 --concurrency 50
+    python -m benchmarks.login_throughput --blocking   # old behaviour
+
+BCRYPT_ROUNDS and PASSWORD_HASH_WORKERS are read from the environment.
+"""
+import argparse
+import asyncio
+import time
+
+import auth
+
+PROBE_INTERVAL = 0.005
+
+async def blocking_verify(plain_password: str, hashed_password: str) -> bool:
+    """The previous behaviour: bcrypt on the event loop thread"""
+    return auth.pwd_context.verify(plain_password, hashed_password)
+
+async def probe_loop_lag(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def run(logins: int, concurrency: int, blocking: bool):
+    password = "correct horse battery staple"
+    hashed = auth.pwd_context.hash(password)
+    verify = blocking_verify if blocking else auth.verify_password
+    # Keep the queue limit from rejecting the benchmark's own burst
+    auth.PASSWORD_HASH_QUEUE_LIMIT = max(auth.PASSWORD_HASH_QUEUE_LIMIT, concurrency)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags, stop = [], [], asyncio.Event()
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            assert await verify(password, hashed)
+            latencies.append(time.perf_counter() - start)
+
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    print(f"mode:              {'blocking' if blocking else 'password pool'}")
+    print(f"bcrypt rounds:     {auth.BCRYPT_ROUNDS}, workers: {auth.PASSWORD_HASH_WORKERS}")
+    print(f"logins:            {logins} in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+    print(f"login latency p50/p99: {percentile(latencies, 0.50) * 1000:.1f} / "
+          f"{percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"event loop lag p50/p99/max: {percentile(lags, 0.50) * 1000:.1f} / "
+          f"{percentile(lags, 0.99) * 1000:.1f} / {max(lags) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--blocking", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.concurrency, args.blocking))
@@ -0,0 +1,114 @@
+"""Response encoding benchmark: APIResponse path vs FastJSONResponse.
+
+Mounts the /api/vehicles and /api/bookings payload shapes twice in a
+throwaway FastAPI app. One copy goes through response_model=APIResponse,
+which validates and re-encodes the data like the current routes. The other
+copy returns the pre-built envelope through FastJSONResponse, as routes do
+with FAST_RESPONSES=1. Requests are driven straight through the ASGI
+interface, so the numbers are framework and encoding cost only.
+
+Needs no database. Run from the backend directory:
+
+    python -m benchmarks.response_encoding --requests 2000 --bookings 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+
+from benchmarks.asgi import call_asgi
+from models import APIResponse
+from responses import FastJSONResponse
+
+def sample_vehicles(count: int) -> list:
+    return [{
+        "id": f"vehicle-{i}",
+        "name": f"Vehicle {i}",
+        "type": "Premium",
+        "category": "chauffeur",
+        "image_url": "https://images.unsplash.com/photo-1617788138017-80ad40651399?w=600&h=400&fit=crop",
+        "price_per_hour": 85,
+        "price_per_day": 650,
+        "features": ["Autopilot", "Premium Interior", "Long Range"],
+        "passengers": 5,
+        "description": "Luxury electric sedan with premium comfort",
+        "available": True,
+        "location": "San Francisco",
+        "created_at": datetime.utcnow().isoformat()
+    } for i in range(count)]
+
+def sample_bookings(count: int) -> dict:
+    now = datetime.utcnow()
+    items = [{
+        "id": str(uuid.uuid4()),
+        "user_id": "user-1",
+        "pickup_location": "San Francisco International Airport",
+        "destination": "Union Square",
+        "pickup_date": "2025-02-01",
+        "pickup_time": "09:30:00",
+        "passengers": 2,
+        "vehicle_type": "Premium",
+        "extras": ["Child Seat"],
+        "payment_method": "icp",
+        "base_price": 85.0,
+        "extras_price": 15.0,
+        "discount_amount": 15.0,
+        "total_price": 85.0,
+        "pickup_lat": 37.6213,
+        "pickup_lng": -122.379,
+        "drop_lat": 37.788,
+        "drop_lng": -122.4075,
+        "status": "completed",
+        "created_at": (now - timedelta(hours=i)).isoformat(),
+        "updated_at": (now - timedelta(hours=i)).isoformat()
+    } for i in range(count)]
+    return {"items": items, "next_cursor": None, "limit": count}
+
+def build_app(vehicles: list, bookings: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy/vehicles", response_model=APIResponse)
+    async def legacy_vehicles():
+        return APIResponse(success=True, message="Vehicles retrieved successfully", data=vehicles)
+
+    @app.get("/fast/vehicles")
+    async def fast_vehicles():
+        return FastJSONResponse({"success": True, "message": "Vehicles retrieved successfully",
+                                 "data": vehicles})
+
+    @app.get("/legacy/bookings", response_model=APIResponse)
+    async def legacy_bookings():
+        return APIResponse(success=True, message="Bookings retrieved successfully", data=bookings)
+
+    @app.get("/fast/bookings")
+    async def fast_bookings():
+        return FastJSONResponse({"success": True, "message": "Bookings retrieved successfully",
+                                 "data": bookings})
+
+    return app
+
+async def measure(app, path: str, requests: int) -> float:
+    await call_asgi(app, "GET", path)  # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call_asgi(app, "GET", path)
+    return requests / (time.perf_counter() - start)
+
+async def run(requests: int, vehicle_count: int, booking_count: int):
+    app = build_app(sample_vehicles(vehicle_count), sample_bookings(booking_count))
+    for name in ("vehicles", "bookings"):
+        legacy = await measure(app, f"/legacy/{name}", requests)
+        fast = await measure(app, f"/fast/{name}", requests)
+        print(f"/api/{name:<9} APIResponse: {legacy:8.0f} req/s   "
+              f"FastJSONResponse: {fast:8.0f} req/s   ({fast / legacy:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--vehicles", type=int, default=20)
+    parser.add_argument("--bookings", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.vehicles, args.bookings))
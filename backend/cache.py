@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+
+from fastapi import Request, Response
+
+from database import db
+from responses import dumps
+
+# Seconds each collection's cached responses stay fresh
+CONTENT_TTLS = {
+    "services": 3600,
+    "faqs": 3600,
+    "locations": 3600,
+    "testimonials": 600,
+    "blog_posts": 600,
+    "vehicles": 300,
+}
+DEFAULT_TTL = 300
+MAX_ENTRIES = 256
+
+class TTLCache:
+    """Small bounded LRU mapping whose entries expire after a fixed TTL"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        item = self._entries.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        item = self._entries.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class CacheEntry:
+    __slots__ = ("data", "body", "etag", "expires_at")
+
+    def __init__(self, data: Any, message: str, ttl: float):
+        self.data = data
+        # Serialized once; every hit serves these bytes as-is
+        self.body = dumps({"success": True, "message": message, "data": data})
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+class ContentCache:
+    """Bounded LRU read-through cache for rarely changing content endpoints.
+
+    Entries are keyed by (collection, key) so a whole collection can be
+    invalidated at once, which happens on every write through db.on_change.
+    Concurrent misses on the same key share one load, and a load that
+    overlaps an invalidation is served but not stored.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = DEFAULT_TTL, max_entries: int = MAX_ENTRIES):
+        self.ttls = ttls if ttls is not None else dict(CONTENT_TTLS)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Any], CacheEntry]" = OrderedDict()
+        self._loading: Dict[Tuple[str, Any], asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, collection: str, key: Any, loader: Callable[[], Awaitable[Any]],
+                  message: str) -> CacheEntry:
+        cache_key = (collection, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(cache_key)
+            return entry
+
+        pending = self._loading.get(cache_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[cache_key] = future
+        generation = self._generations.setdefault(collection, 0)
+        try:
+            data = await loader()
+            entry = CacheEntry(data, message, self.ttls.get(collection, self.default_ttl))
+            if self._generations.get(collection, 0) == generation:
+                self._store(cache_key, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't leave the exception unretrieved
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(cache_key, None)
+
+    def _store(self, cache_key: Tuple[str, Any], entry: CacheEntry):
+        self._entries[cache_key] = entry
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, collection: Optional[str] = None):
+        """Drop cached entries for one collection, or everything"""
+        if collection is None:
+            self._entries.clear()
+            for name in list(self._generations):
+                self._generations[name] += 1
+            return
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        for cache_key in [k for k in self._entries if k[0] == collection]:
+            del self._entries[cache_key]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def cached_response(request: Request, entry: CacheEntry) -> Response:
+    """Serve a cache entry, answering conditional requests with 304"""
+    headers = {"ETag": entry.etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+# Global content cache instance
+content_cache = ContentCache()
+for cached_collection in CONTENT_TTLS:
+    db.on_change(cached_collection,
+                 lambda document_id, collection=cached_collection: content_cache.invalidate(collection))
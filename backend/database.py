@@ -1,87 +1,401 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, AsyncIterator
 import os
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 import json
-from bson import ObjectId
+import base64
+import uuid
+from bson import ObjectId, json_util
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+
+from metrics import timed
+from query_monitor import slow_query_monitor
+
+class DateEncoder(TypeEncoder):
+    """Store calendar dates (pickup_date, publish_date, ...) as ISO strings.
+
+    BSON has no date-only type; datetimes are stored natively and are not
+    affected, since BSON encodes them before custom encoders are consulted.
+    """
+    python_type = date
+
+    def transform_python(self, value: date) -> str:
+        return value.isoformat()
+
+class TimeEncoder(TypeEncoder):
+    """Store wall-clock times (pickup_time, return_time) as ISO strings"""
+    python_type = time
+
+    def transform_python(self, value: time) -> str:
+        return value.isoformat()
+
+# Codec applied by the driver while encoding, so writes need no Python-side tree walk
+CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DateEncoder(), TimeEncoder()]))
+
+# Timestamp fields stored as native BSON dates; migrate_datetime_fields converts
+# values written as ISO strings by older versions
+DATETIME_FIELDS = {
+    "users": ["created_at", "updated_at"],
+    "user_profiles": ["created_at", "updated_at"],
+    "drivers": ["created_at", "updated_at", "location_updated_at"],
+    "bookings": ["created_at", "updated_at", "started_at", "completed_at"],
+    "vehicles": ["created_at", "updated_at"],
+    "testimonials": ["created_at", "updated_at"],
+    "promo_codes": ["valid_from", "valid_to", "updated_at"],
+    "payments": ["created_at", "updated_at"],
+    "reward_transactions": ["created_at"],
+    "staking_pools": ["staked_at", "last_reward_at"],
+}
+
+# Default and maximum page sizes for cursor pagination
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Documents fetched per round trip when streaming large result sets
+STREAM_BATCH_SIZE = 500
+
+# Default search radius and result size for nearest-driver lookups
+DRIVER_SEARCH_RADIUS_METERS = 5000
+DRIVER_SEARCH_LIMIT = 10
+
+# Earnings rollup periods and how many past buckets the summary returns for each
+EARNINGS_PERIODS = {"day": 30, "week": 12, "month": 12}
+
+# Raw GPS track buckets expire this many days after their hour starts
+TRACK_RETENTION_DAYS = int(os.environ.get("TRACK_RETENTION_DAYS", "30"))
+
+# Collections addressed by their string "id" through get_document/update_document
+ID_COLLECTIONS = [
+    "users", "user_profiles", "drivers", "bookings", "vehicles", "locations",
+    "services", "testimonials", "blog_posts", "faqs", "pricing_rules",
+    "extras", "promo_codes", "reward_transactions"
+]
+
+# Declarative index registry, ensured idempotently at connect
+INDEXES: Dict[str, List[IndexModel]] = {
+    name: [IndexModel([("id", ASCENDING)], name="id_unique", unique=True)]
+    for name in ID_COLLECTIONS
+}
+INDEXES["users"] += [
+    IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+]
+INDEXES["user_profiles"] += [
+    # Unique so reward balance upserts can never create a second profile
+    IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+]
+INDEXES["drivers"] += [
+    IndexModel([("user_id", ASCENDING)], name="user_id"),
+    IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    IndexModel([("status", ASCENDING)], name="status"),
+]
+INDEXES["bookings"] += [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+               name="user_id_created_at_id"),
+    IndexModel([("driver_id", ASCENDING), ("status", ASCENDING)], name="driver_id_status"),
+    IndexModel([("driver_id", ASCENDING), ("created_at", DESCENDING)], name="driver_id_created_at"),
+    IndexModel([("status", ASCENDING), ("driver_id", ASCENDING)], name="status_driver_id"),
+    IndexModel([("vehicle_id", ASCENDING), ("status", ASCENDING)], name="vehicle_id_status"),
+]
+INDEXES["vehicles"] += [
+    IndexModel([("available", ASCENDING), ("category", ASCENDING)], name="available_category"),
+    IndexModel([("available", ASCENDING), ("type", ASCENDING)], name="available_type"),
+]
+INDEXES["pricing_rules"] += [
+    IndexModel([("vehicle_type", ASCENDING)], name="vehicle_type"),
+]
+INDEXES["promo_codes"] += [
+    IndexModel([("code", ASCENDING)], name="code"),
+]
+INDEXES["services"] += [
+    IndexModel([("order", ASCENDING)], name="order"),
+]
+INDEXES["testimonials"] += [
+    IndexModel([("approved", ASCENDING), ("created_at", DESCENDING)], name="approved_created_at"),
+]
+INDEXES["blog_posts"] += [
+    IndexModel([("published", ASCENDING), ("publish_date", DESCENDING)], name="published_publish_date"),
+]
+INDEXES["faqs"] += [
+    IndexModel([("category", ASCENDING), ("order", ASCENDING)], name="category_order"),
+]
+INDEXES["reward_transactions"] += [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+               name="user_id_created_at_id"),
+]
+INDEXES["driver_earnings"] = [
+    IndexModel([("driver_id", ASCENDING), ("period", ASCENDING), ("period_start", DESCENDING)],
+               name="driver_id_period_start", unique=True),
+]
+INDEXES["driver_tracks"] = [
+    IndexModel([("driver_id", ASCENDING), ("bucket_start", DESCENDING)],
+               name="driver_id_bucket_start", unique=True),
+    IndexModel([("bucket_start", ASCENDING)], name="bucket_start_ttl",
+               expireAfterSeconds=TRACK_RETENTION_DAYS * 86400),
+]
+
+# Driver fields riders may see in nearby-driver results
+PUBLIC_DRIVER_FIELDS = ["id", "vehicle_id", "rating", "status", "current_lat", "current_lng"]
+
+# Booking statuses in which a driver holds the job and may hand it back
+ASSIGNED_STATUSES = ["driver_assigned", "en_route_to_pickup", "arrived_pickup", "en_route_to_dropoff"]
+
+# Query shapes issued by the Database methods, checked by verify_query_plans.
+# (collection, filter, sort) with representative placeholder values.
+QUERY_SHAPES = [
+    ("users", {"email": "user@example.com"}, None),
+    *[(name, {"id": "id"}, None) for name in ID_COLLECTIONS],
+    ("drivers", {"user_id": "user"}, None),
+    ("drivers", {"status": "online"}, None),
+    ("bookings", {"user_id": "user"}, [("created_at", -1)]),
+    ("bookings", {"driver_id": "driver", "status": "completed"}, None),
+    ("bookings", {"driver_id": "driver", "status": {"$nin": ["completed", "cancelled"]}}, None),
+    ("bookings", {"status": "requested", "driver_id": None}, None),
+    ("bookings", {"driver_id": "driver"}, [("created_at", -1)]),
+    ("bookings", {"vehicle_id": {"$ne": None}, "status": {"$nin": ["cancelled", "completed"]}}, None),
+    ("vehicles", {"category": "chauffeur", "available": True}, None),
+    ("vehicles", {"available": True, "type": "Premium"}, None),
+    ("pricing_rules", {"vehicle_type": "Premium"}, None),
+    ("promo_codes", {"code": "CODE", "active": True}, None),
+    ("services", {}, [("order", 1)]),
+    ("testimonials", {"approved": True}, [("created_at", -1)]),
+    ("blog_posts", {"published": True}, [("publish_date", -1)]),
+    ("faqs", {"category": "general"}, [("order", 1)]),
+    ("reward_transactions", {"user_id": "user"}, [("created_at", -1)]),
+    ("driver_tracks", {"driver_id": "driver"}, [("bucket_start", -1)]),
+]
+
+def period_start(moment: datetime, period: str) -> datetime:
+    """Start of the UTC day, ISO week (Monday) or month containing moment"""
+    day = datetime(moment.year, moment.month, moment.day)
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown earnings period: {period}")
+
+# Sort key value types a pagination cursor may carry
+CURSOR_VALUE_TYPES = (datetime, str, int, float)
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque continuation token for the sort key values of the last item on a page"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Inverse of encode_cursor; raises ValueError for tokens this page cannot have issued"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid pagination cursor")
+    # Values are spliced into the filter, so anything but a scalar could carry operators
+    if not all(value is None or isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise ValueError("Invalid pagination cursor")
+    return values
+
+def keyset_filter(sort: List[tuple], values: List[Any]) -> Dict[str, Any]:
+    """Filter matching documents strictly after the given sort key values"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def build_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """Mongo projection returning only the given fields (and never _id)"""
+    if not fields:
+        return None
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of an explain winningPlan tree"""
+    stages = [plan.get("stage")] if plan.get("stage") else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+def plan_indexes(plan: Dict[str, Any]) -> List[str]:
+    """Index names used anywhere in an explain winningPlan tree"""
+    indexes = [plan["indexName"]] if plan.get("indexName") else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            indexes += plan_indexes(plan[key])
+    for child in plan.get("inputStages", []):
+        indexes += plan_indexes(child)
+    return indexes
+
+def winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """The winningPlan of an explain result, including aggregate $cursor stages"""
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"]["winningPlan"]
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["queryPlanner"]["winningPlan"]
+    return {}
 
 class Database:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
+        self._change_listeners: Dict[str, List[Callable[[str], None]]] = {}
 
     async def connect(self):
         mongo_url = os.environ['MONGO_URL']
         db_name = os.environ.get('DB_NAME', 'riide_dapp')
         
-        self.client = AsyncIOMotorClient(mongo_url)
-        self.db = self.client[db_name]
+        self.client = AsyncIOMotorClient(mongo_url, event_listeners=[slow_query_monitor])
+        self.db = self.client.get_database(db_name, codec_options=CODEC_OPTIONS)
         
         # Test connection
         await self.client.admin.command('ping')
         print(f"Connected to MongoDB: {db_name}")
+        
+        slow_query_monitor.attach(self.explain_command)
+        
+        await self.ensure_indexes()
+        await self.backfill_driver_locations()
+        
+        # String timestamps sort apart from dates and never match date range
+        # filters, so convert any left over before serving; a value that does
+        # not parse fails startup rather than silently dropping out of queries
+        migrated = await self.migrate_datetime_fields()
+        if any(migrated.values()):
+            print(f"Converted string timestamps to dates: {migrated}")
+        
+        if os.environ.get('DB_VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes'):
+            await self.verify_query_plans()
+
+    def on_change(self, collection: str, callback: Callable[[str], None]):
+        """Register a callback invoked with the document id after it is created, updated or deleted"""
+        self._change_listeners.setdefault(collection, []).append(callback)
+
+    def notify_change(self, collection: str, document_id: str):
+        for callback in self._change_listeners.get(collection, ()):
+            callback(document_id)
+
+    async def ensure_indexes(self):
+        """Create every index in the registry; existing indexes are left alone"""
+        for collection, indexes in INDEXES.items():
+            try:
+                await self.db[collection].create_indexes(indexes)
+            except OperationFailure as e:
+                # e.g. duplicate data blocking a unique index; keep serving
+                print(f"Could not ensure indexes on {collection}: {e}")
+
+    async def verify_query_plans(self) -> List[Dict[str, Any]]:
+        """Explain each known query shape and report the ones that still COLLSCAN"""
+        collscans = []
+        for collection, filter_dict, sort in QUERY_SHAPES:
+            command = {"find": collection, "filter": filter_dict}
+            if sort:
+                command["sort"] = dict(sort)
+            stages = (await self.explain_command(command))["stages"]
+            if "COLLSCAN" in stages:
+                collscans.append({"collection": collection, "filter": filter_dict, "sort": sort})
+                print(f"COLLSCAN on {collection}: filter={filter_dict} sort={sort}")
+        return collscans
+
+    async def explain_command(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        """Summarize the plan the server would pick for command, without running it"""
+        explain = await self.db.command("explain", command, verbosity="queryPlanner")
+        plan = winning_plan(explain)
+        return {"stages": plan_stages(plan), "indexes": plan_indexes(plan)}
 
     async def close(self):
         if self.client:
             self.client.close()
 
-    def serialize_datetime(self, obj):
-        """Convert datetime objects to ISO format for JSON serialization"""
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        elif isinstance(obj, dict):
-            return {k: self.serialize_datetime(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self.serialize_datetime(item) for item in obj]
-        return obj
-
     def prepare_document(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare document for MongoDB insertion"""
         if doc is None:
             return {}
         
-        # Convert datetime objects
-        doc = self.serialize_datetime(doc)
-        
-        # Remove None values
+        # Remove None values; dates and times are handled by CODEC_OPTIONS
         return {k: v for k, v in doc.items() if v is not None}
 
+    async def migrate_datetime_fields(self) -> Dict[str, int]:
+        """Convert timestamp fields stored as ISO strings to native BSON dates"""
+        migrated = {}
+        for collection, fields in DATETIME_FIELDS.items():
+            total = 0
+            for field in fields:
+                result = await self.db[collection].update_many(
+                    {field: {"$type": "string"}},
+                    [{"$set": {field: {"$dateFromString": {"dateString": f"${field}"}}}}]
+                )
+                total += result.modified_count
+            migrated[collection] = total
+        return migrated
+
     # Generic CRUD operations
+    @timed()
     async def create_document(self, collection: str, document: Dict[str, Any]) -> str:
         """Create a new document and return its ID"""
         doc = self.prepare_document(document)
         result = await self.db[collection].insert_one(doc)
-        return document.get('id', str(result.inserted_id))
+        document_id = document.get('id', str(result.inserted_id))
+        self.notify_change(collection, document_id)
+        return document_id
 
-    async def get_document(self, collection: str, document_id: str) -> Optional[Dict[str, Any]]:
-        """Get document by ID"""
-        doc = await self.db[collection].find_one({"id": document_id})
+    @timed()
+    async def create_documents(self, collection: str, documents: List[Dict[str, Any]]) -> List[str]:
+        """Bulk-insert documents in one unordered insert_many and return their IDs"""
+        if not documents:
+            return []
+        docs = [self.prepare_document(document) for document in documents]
+        result = await self.db[collection].insert_many(docs, ordered=False)
+        document_ids = [document.get('id', str(inserted_id))
+                        for document, inserted_id in zip(documents, result.inserted_ids)]
+        for document_id in document_ids:
+            self.notify_change(collection, document_id)
+        return document_ids
+
+    @timed()
+    async def get_document(self, collection: str, document_id: str,
+                           fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Get document by ID, optionally returning only the given fields"""
+        doc = await self.db[collection].find_one({"id": document_id}, build_projection(fields))
         if doc:
             doc.pop('_id', None)  # Remove MongoDB ObjectId
         return doc
 
+    @timed()
     async def update_document(self, collection: str, document_id: str, updates: Dict[str, Any]) -> bool:
         """Update document by ID"""
         updates = self.prepare_document(updates)
-        updates['updated_at'] = datetime.utcnow().isoformat()
+        updates['updated_at'] = datetime.utcnow()
         
         result = await self.db[collection].update_one(
             {"id": document_id},
             {"$set": updates}
         )
+        self.notify_change(collection, document_id)
         return result.modified_count > 0
 
+    @timed()
     async def delete_document(self, collection: str, document_id: str) -> bool:
         """Delete document by ID"""
         result = await self.db[collection].delete_one({"id": document_id})
+        self.notify_change(collection, document_id)
         return result.deleted_count > 0
 
+    @timed()
     async def find_documents(self, collection: str, filter_dict: Dict[str, Any] = None, 
-                           limit: int = 100, skip: int = 0, sort: List[tuple] = None) -> List[Dict[str, Any]]:
-        """Find documents with optional filtering, pagination, and sorting"""
+                           limit: int = 100, skip: int = 0, sort: List[tuple] = None,
+                           fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Find documents with optional filtering, pagination, sorting and projection"""
         filter_dict = filter_dict or {}
         
-        cursor = self.db[collection].find(filter_dict)
+        cursor = self.db[collection].find(filter_dict, build_projection(fields))
         
         if sort:
             cursor = cursor.sort(sort)
@@ -95,6 +409,57 @@ class Database:
         
         return documents
 
+    async def find_page(self, collection: str, filter_dict: Dict[str, Any] = None,
+                        sort: List[tuple] = None, limit: int = DEFAULT_PAGE_SIZE,
+                        cursor: Optional[str] = None,
+                        fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Keyset-paginated find.
+
+        Pages are ordered by sort plus id as a tie-breaker and continue after
+        the position encoded in cursor, so every page costs the same however
+        deep it is. Returns {"items", "next_cursor", "limit"}; next_cursor is
+        None on the last page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sort = list(sort or [])
+        if not any(field == "id" for field, _ in sort):
+            sort.append(("id", sort[-1][1] if sort else 1))
+        
+        extra_fields = []
+        if fields:
+            # Sort keys are needed to build the continuation token
+            extra_fields = [field for field, _ in sort if field not in fields]
+            fields = [*fields, *extra_fields]
+        
+        filter_dict = filter_dict or {}
+        if cursor:
+            after = keyset_filter(sort, decode_cursor(cursor, len(sort)))
+            filter_dict = {"$and": [filter_dict, after]} if filter_dict else after
+        
+        items = await self.find_documents(collection, filter_dict, limit=limit + 1, sort=sort,
+                                          fields=fields)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([items[-1].get(field) for field, _ in sort])
+        for item in items:
+            for field in extra_fields:
+                item.pop(field, None)
+        
+        return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+    async def stream_documents(self, collection: str, filter_dict: Dict[str, Any] = None,
+                               sort: List[tuple] = None, batch_size: int = STREAM_BATCH_SIZE,
+                               fields: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield matching documents straight from the cursor without collecting them"""
+        projection = build_projection(fields) or {"_id": 0}
+        cursor = self.db[collection].find(filter_dict or {}, projection, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        async for doc in cursor:
+            yield doc
+
+    @timed()
     async def count_documents(self, collection: str, filter_dict: Dict[str, Any] = None) -> int:
         """Count documents matching filter"""
         filter_dict = filter_dict or {}
@@ -104,6 +469,7 @@ class Database:
     async def create_user(self, user_data: Dict[str, Any]) -> str:
         return await self.create_document("users", user_data)
 
+    @timed("users")
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         doc = await self.db.users.find_one({"email": email})
         if doc:
@@ -114,19 +480,24 @@ class Database:
         return await self.get_document("users", user_id)
 
     # Vehicle operations
-    async def get_vehicles_by_category(self, category: str) -> List[Dict[str, Any]]:
-        return await self.find_documents("vehicles", {"category": category, "available": True})
+    async def get_vehicles_by_category(self, category: str,
+                                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return await self.find_documents("vehicles", {"category": category, "available": True},
+                                         fields=fields)
 
-    async def get_available_vehicles(self, vehicle_type: str = None) -> List[Dict[str, Any]]:
+    async def get_available_vehicles(self, vehicle_type: str = None,
+                                     fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         filter_dict = {"available": True}
         if vehicle_type:
             filter_dict["type"] = vehicle_type
-        return await self.find_documents("vehicles", filter_dict)
+        return await self.find_documents("vehicles", filter_dict, fields=fields)
 
     # Booking operations  
-    async def get_user_bookings(self, user_id: str) -> List[Dict[str, Any]]:
-        return await self.find_documents("bookings", {"user_id": user_id}, 
-                                       sort=[("created_at", -1)])
+    async def get_user_bookings(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE,
+                                cursor: Optional[str] = None,
+                                fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self.find_page("bookings", {"user_id": user_id}, sort=[("created_at", -1)],
+                                    limit=limit, cursor=cursor, fields=fields)
 
     async def get_driver_bookings(self, driver_id: str, status: str = None) -> List[Dict[str, Any]]:
         filter_dict = {"driver_id": driver_id}
@@ -135,6 +506,204 @@ class Database:
         return await self.find_documents("bookings", filter_dict, 
                                        sort=[("pickup_date", 1), ("pickup_time", 1)])
 
+    @timed("bookings")
+    async def claim_booking(self, booking_id: str, driver_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically assign an unclaimed requested booking to a driver.
+
+        Returns the updated booking, or None if it does not exist or another
+        driver claimed it first.
+        """
+        now = datetime.utcnow()
+        return await self.db.bookings.find_one_and_update(
+            {"id": booking_id, "status": "requested", "driver_id": None},
+            {"$set": {
+                "driver_id": driver_id,
+                "status": "driver_assigned",
+                "started_at": now,
+                "updated_at": now
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @timed("bookings")
+    async def release_booking(self, booking_id: str, driver_id: str) -> Optional[Dict[str, Any]]:
+        """Return a driver's booking to the requested pool, unassigned.
+
+        Returns the booking as re-offered, or None if it is not assigned to
+        this driver or no longer in one of ASSIGNED_STATUSES.
+        """
+        now = datetime.utcnow()
+        result = await self.db.bookings.update_one(
+            {"id": booking_id, "driver_id": driver_id, "status": {"$in": ASSIGNED_STATUSES}},
+            {"$set": {"status": "requested", "driver_id": None, "started_at": None,
+                      "updated_at": now}}
+        )
+        self.notify_change("bookings", booking_id)
+        if not result.modified_count:
+            return None
+        return await self.get_document("bookings", booking_id)
+
+    @timed("bookings")
+    async def complete_booking(self, booking_id: str, updates: Dict[str, Any]) -> bool:
+        """Mark a booking completed unless it already is; False means nothing changed"""
+        updates = self.prepare_document(updates)
+        updates["updated_at"] = datetime.utcnow()
+        result = await self.db.bookings.update_one(
+            {"id": booking_id, "status": {"$ne": "completed"}},
+            {"$set": {**updates, "status": "completed", "earnings_credited": False}}
+        )
+        self.notify_change("bookings", booking_id)
+        return result.modified_count > 0
+
+    @timed("bookings")
+    async def credit_driver_earnings(self, booking_id: str) -> bool:
+        """Credit a completed booking to its driver unless that already happened.
+
+        The booking's earnings_credited flag is claimed first, so concurrent or
+        repeated calls credit it once; if crediting then fails the flag is
+        released again for a retry. Returns whether this call credited it.
+        A crash between the two leaves the flag set without the credit, which
+        rebuild_driver_earnings repairs.
+        """
+        booking = await self.db.bookings.find_one_and_update(
+            {"id": booking_id, "status": "completed", "earnings_credited": False},
+            {"$set": {"earnings_credited": True}},
+            projection={"_id": 0, "driver_id": 1, "actual_cost": 1, "completed_at": 1}
+        )
+        if not booking:
+            return False
+        try:
+            await self.record_driver_earnings(booking["driver_id"], booking["actual_cost"],
+                                              booking["completed_at"])
+        except Exception:
+            await self.db.bookings.update_one({"id": booking_id},
+                                              {"$set": {"earnings_credited": False}})
+            raise
+        return True
+
+    @timed("driver_earnings")
+    async def record_driver_earnings(self, driver_id: str, amount: float, completed_at: datetime):
+        """Credit a completed ride to the driver's counters and earnings rollups.
+
+        Both writes are $inc, so concurrent completions never lose an update
+        and nothing has to be read first.
+        """
+        await self.db.drivers.update_one(
+            {"id": driver_id},
+            {"$inc": {"total_earnings": amount, "total_rides": 1},
+             "$set": {"updated_at": datetime.utcnow()}}
+        )
+        await self.db.driver_earnings.bulk_write([
+            UpdateOne(
+                {"driver_id": driver_id, "period": period,
+                 "period_start": period_start(completed_at, period)},
+                {"$inc": {"earnings": amount, "rides": 1},
+                 "$set": {"updated_at": completed_at}},
+                upsert=True
+            )
+            for period in EARNINGS_PERIODS
+        ], ordered=False)
+        self.notify_change("drivers", driver_id)
+
+    async def rebuild_driver_earnings(self, batch_size: int = 1000) -> int:
+        """Recompute driver counters and every rollup from completed bookings.
+
+        For backfilling history recorded before the rollups existed, or after
+        bulk loads that bypass record_driver_earnings. Needs MongoDB 5.0+ for
+        $dateTrunc. Returns the number of rollup documents written.
+        """
+        written = 0
+        for period in EARNINGS_PERIODS:
+            truncate = {"date": "$completed_at", "unit": period}
+            if period == "week":
+                truncate["startOfWeek"] = "monday"
+            pipeline = [
+                {"$match": {"status": "completed", "driver_id": {"$ne": None},
+                            "completed_at": {"$type": "date"}}},
+                {"$group": {
+                    "_id": {"driver_id": "$driver_id", "period_start": {"$dateTrunc": truncate}},
+                    "earnings": {"$sum": {"$ifNull": ["$actual_cost", "$total_price"]}},
+                    "rides": {"$sum": 1}
+                }}
+            ]
+            rows = await self.db.bookings.aggregate(pipeline, allowDiskUse=True).to_list(None)
+            operations = [
+                UpdateOne(
+                    {"driver_id": row["_id"]["driver_id"], "period": period,
+                     "period_start": row["_id"]["period_start"]},
+                    {"$set": {"earnings": row["earnings"], "rides": row["rides"],
+                              "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+                for row in rows
+            ]
+            for start in range(0, len(operations), batch_size):
+                await self.db.driver_earnings.bulk_write(operations[start:start + batch_size],
+                                                         ordered=False)
+            written += len(operations)
+        
+        # Lifetime counters come from the same ledger
+        pipeline = [
+            {"$match": {"status": "completed", "driver_id": {"$ne": None}}},
+            {"$group": {"_id": "$driver_id",
+                        "earnings": {"$sum": {"$ifNull": ["$actual_cost", "$total_price"]}},
+                        "rides": {"$sum": 1}}}
+        ]
+        operations = [
+            UpdateOne({"id": row["_id"]},
+                      {"$set": {"total_earnings": row["earnings"], "total_rides": row["rides"]}})
+            async for row in self.db.bookings.aggregate(pipeline, allowDiskUse=True)
+        ]
+        for start in range(0, len(operations), batch_size):
+            await self.db.drivers.bulk_write(operations[start:start + batch_size], ordered=False)
+        return written
+
+    @timed("driver_earnings")
+    async def get_driver_earnings_summary(self, driver_id: str,
+                                          now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Recent daily, weekly and monthly rollups plus lifetime totals.
+
+        Reads at most sum(EARNINGS_PERIODS.values()) rollup documents through
+        the driver_id_period_start index, however many rides the driver has.
+        """
+        now = now or datetime.utcnow()
+        cutoffs = {
+            "day": period_start(now, "day") - timedelta(days=EARNINGS_PERIODS["day"] - 1),
+            "week": period_start(now, "week") - timedelta(weeks=EARNINGS_PERIODS["week"] - 1),
+            "month": period_start(now - timedelta(days=31 * (EARNINGS_PERIODS["month"] - 1)), "month")
+        }
+        buckets: Dict[str, List[Dict[str, Any]]] = {period: [] for period in EARNINGS_PERIODS}
+        cursor = self.db.driver_earnings.find(
+            {"driver_id": driver_id, "$or": [
+                {"period": period, "period_start": {"$gte": cutoff}}
+                for period, cutoff in cutoffs.items()
+            ]},
+            {"_id": 0, "period": 1, "period_start": 1, "earnings": 1, "rides": 1}
+        ).sort("period_start", DESCENDING)
+        async for doc in cursor:
+            buckets[doc.pop("period")].append(doc)
+        
+        def current(period: str) -> Dict[str, Any]:
+            latest = buckets[period][0] if buckets[period] else None
+            if latest and latest["period_start"] == period_start(now, period):
+                return {"earnings": latest["earnings"], "rides": latest["rides"]}
+            return {"earnings": 0.0, "rides": 0}
+        
+        driver = await self.db.drivers.find_one(
+            {"id": driver_id}, {"_id": 0, "total_earnings": 1, "total_rides": 1}
+        ) or {}
+        return {
+            "total": {"earnings": driver.get("total_earnings", 0.0),
+                      "rides": driver.get("total_rides", 0)},
+            "today": current("day"),
+            "this_week": current("week"),
+            "this_month": current("month"),
+            "daily": buckets["day"][:EARNINGS_PERIODS["day"]],
+            "weekly": buckets["week"][:EARNINGS_PERIODS["week"]],
+            "monthly": buckets["month"][:EARNINGS_PERIODS["month"]]
+        }
+
     # Pricing operations
     async def get_pricing_rules(self) -> List[Dict[str, Any]]:
         return await self.find_documents("pricing_rules")
@@ -142,8 +711,9 @@ class Database:
     async def get_extras(self) -> List[Dict[str, Any]]:
         return await self.find_documents("extras")
 
+    @timed("promo_codes")
     async def validate_promo_code(self, code: str) -> Optional[Dict[str, Any]]:
-        now = datetime.utcnow().isoformat()
+        now = datetime.utcnow()
         doc = await self.db.promo_codes.find_one({
             "code": code,
             "active": True,
@@ -155,6 +725,7 @@ class Database:
             doc.pop('_id', None)
         return doc
 
+    @timed("promo_codes")
     async def increment_promo_usage(self, promo_id: str):
         await self.db.promo_codes.update_one(
             {"id": promo_id},
@@ -162,46 +733,201 @@ class Database:
         )
 
     # Content operations
-    async def get_services(self) -> List[Dict[str, Any]]:
-        return await self.find_documents("services", sort=[("order", 1)])
+    async def get_services(self, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return await self.find_documents("services", sort=[("order", 1)], fields=fields)
 
-    async def get_testimonials(self, approved_only: bool = True) -> List[Dict[str, Any]]:
+    async def get_testimonials(self, approved_only: bool = True,
+                               fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         filter_dict = {"approved": True} if approved_only else {}
         return await self.find_documents("testimonials", filter_dict, 
-                                       sort=[("created_at", -1)])
+                                       sort=[("created_at", -1)], fields=fields)
 
-    async def get_blog_posts(self, published_only: bool = True, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_blog_posts(self, published_only: bool = True, limit: int = 10,
+                             fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         filter_dict = {"published": True} if published_only else {}
         return await self.find_documents("blog_posts", filter_dict, 
-                                       limit=limit, sort=[("publish_date", -1)])
+                                       limit=limit, sort=[("publish_date", -1)], fields=fields)
 
-    async def get_faqs(self, category: str = None) -> List[Dict[str, Any]]:
+    async def get_faqs(self, category: str = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         filter_dict = {"category": category} if category else {}
-        return await self.find_documents("faqs", filter_dict, sort=[("order", 1)])
+        return await self.find_documents("faqs", filter_dict, sort=[("order", 1)], fields=fields)
 
     # Driver operations
+    @timed("drivers")
     async def get_driver_by_user_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         doc = await self.db.drivers.find_one({"user_id": user_id})
         if doc:
             doc.pop('_id', None)
         return doc
 
-    async def get_available_drivers(self, location: str = None) -> List[Dict[str, Any]]:
+    def geo_point(self, lat: float, lng: float) -> Dict[str, Any]:
+        """Build a GeoJSON point (GeoJSON orders coordinates as lng, lat)"""
+        return {"type": "Point", "coordinates": [float(lng), float(lat)]}
+
+    async def update_driver(self, driver_id: str, updates: Dict[str, Any]) -> bool:
+        """Update a driver, keeping the GeoJSON location in sync with current_lat/current_lng"""
+        lat, lng = updates.get("current_lat"), updates.get("current_lng")
+        if lat is not None and lng is not None:
+            updates = {**updates, "location": self.geo_point(lat, lng)}
+        return await self.update_document("drivers", driver_id, updates)
+
+    async def backfill_driver_locations(self) -> int:
+        """Populate the GeoJSON location on drivers stored before it existed"""
+        result = await self.db.drivers.update_many(
+            {
+                "location": {"$exists": False},
+                "current_lat": {"$type": "number"},
+                "current_lng": {"$type": "number"}
+            },
+            [{"$set": {"location": {
+                "type": "Point",
+                "coordinates": ["$current_lng", "$current_lat"]
+            }}}]
+        )
+        return result.modified_count
+
+    @timed("drivers")
+    async def get_nearest_drivers(self, lat: float, lng: float,
+                                  max_distance: float = DRIVER_SEARCH_RADIUS_METERS,
+                                  limit: int = DRIVER_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Return the nearest online drivers within max_distance meters, closest first.
+
+        Results are shown to riders, so only PUBLIC_DRIVER_FIELDS, the driver's
+        name and distance_meters are returned.
+        """
+        pipeline = [
+            {"$geoNear": {
+                "near": self.geo_point(lat, lng),
+                "distanceField": "distance_meters",
+                "maxDistance": max_distance,
+                "query": {"status": "online"},
+                "spherical": True
+            }},
+            {"$limit": limit},
+            {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+            {"$project": {
+                "_id": 0,
+                **{field: 1 for field in PUBLIC_DRIVER_FIELDS},
+                "name": {"$arrayElemAt": ["$user.name", 0]},
+                "distance_meters": 1
+            }}
+        ]
+        return await self.db.drivers.aggregate(pipeline).to_list(limit)
+
+    async def get_available_drivers(self, location: Optional[Dict[str, float]] = None,
+                                    max_distance: float = DRIVER_SEARCH_RADIUS_METERS,
+                                    limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get online drivers, nearest first when a {"lat", "lng"} location is given.
+
+        limit defaults to DRIVER_SEARCH_LIMIT for a location search and to
+        find_documents' own cap otherwise.
+        """
+        if location:
+            return await self.get_nearest_drivers(location["lat"], location["lng"],
+                                                  max_distance=max_distance,
+                                                  limit=limit or DRIVER_SEARCH_LIMIT)
         filter_dict = {"status": "online"}
-        return await self.find_documents("drivers", filter_dict)
+        if limit is None:
+            return await self.find_documents("drivers", filter_dict)
+        return await self.find_documents("drivers", filter_dict, limit=limit)
 
     # Rewards operations
+    @timed("reward_transactions")
+    async def create_reward_transaction(self, transaction: Dict[str, Any]) -> str:
+        """Append a transaction to the ledger and apply it to the user's running balance.
+
+        The balance and per-type subtotal on user_profiles move with one $inc,
+        so concurrent credits never lose an update. reconcile_reward_balances
+        repairs any drift if the process dies between the two writes.
+        """
+        doc = self.prepare_document(transaction)
+        await self.db.reward_transactions.insert_one(doc)
+        await self.db.user_profiles.update_one(
+            {"user_id": transaction["user_id"]},
+            {
+                "$inc": {
+                    "reward_balance": transaction["amount"],
+                    f"reward_totals.{transaction['type']}": transaction["amount"]
+                },
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+        self.notify_change("reward_transactions", transaction["id"])
+        return transaction["id"]
+
+    @timed("user_profiles")
+    async def get_user_rewards(self, user_id: str) -> Dict[str, Any]:
+        """Materialized {"balance", "totals"} for a user, read from their profile"""
+        profile = await self.db.user_profiles.find_one(
+            {"user_id": user_id}, {"_id": 0, "reward_balance": 1, "reward_totals": 1}
+        )
+        profile = profile or {}
+        return {
+            "balance": profile.get("reward_balance", 0.0),
+            "totals": profile.get("reward_totals", {})
+        }
+
     async def get_user_reward_balance(self, user_id: str) -> float:
+        return (await self.get_user_rewards(user_id))["balance"]
+
+    async def reconcile_reward_balances(self, batch_size: int = 1000) -> int:
+        """Rebuild every materialized balance from the reward_transactions ledger.
+
+        Totals are computed in one aggregation and written back with batched
+        unordered bulk_writes; profiles with a balance but no ledger entries
+        are reset to zero. Credits landing while this runs can be overwritten,
+        so schedule it off-peak. Returns the number of profiles modified.
+        """
         pipeline = [
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+            {"$group": {"_id": {"user_id": "$user_id", "type": "$type"},
+                        "total": {"$sum": "$amount"}}},
+            {"$group": {"_id": "$_id.user_id",
+                        "balance": {"$sum": "$total"},
+                        "totals": {"$push": {"k": "$_id.type", "v": "$total"}}}}
         ]
-        result = await self.db.reward_transactions.aggregate(pipeline).to_list(1)
-        return result[0]["total"] if result else 0.0
+        profiles = self.db.user_profiles
+        modified = 0
+        seen = set()
+        operations = []
+        async for row in self.db.reward_transactions.aggregate(pipeline, allowDiskUse=True):
+            seen.add(row["_id"])
+            operations.append(UpdateOne(
+                {"user_id": row["_id"]},
+                {
+                    "$set": {
+                        "reward_balance": row["balance"],
+                        "reward_totals": {item["k"]: item["v"] for item in row["totals"]}
+                    },
+                    "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.utcnow()}
+                },
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                result = await profiles.bulk_write(operations, ordered=False)
+                modified += result.modified_count + result.upserted_count
+                operations = []
+        
+        async for profile in profiles.find({"reward_balance": {"$exists": True, "$ne": 0}},
+                                           {"_id": 0, "user_id": 1}):
+            if profile["user_id"] not in seen:
+                operations.append(UpdateOne(
+                    {"user_id": profile["user_id"]},
+                    {"$set": {"reward_balance": 0.0, "reward_totals": {}}}
+                ))
+        
+        for start in range(0, len(operations), batch_size):
+            result = await profiles.bulk_write(operations[start:start + batch_size], ordered=False)
+            modified += result.modified_count + result.upserted_count
+        return modified
 
-    async def get_user_reward_history(self, user_id: str) -> List[Dict[str, Any]]:
-        return await self.find_documents("reward_transactions", {"user_id": user_id},
-                                       sort=[("created_at", -1)])
+    async def get_user_reward_history(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE,
+                                      cursor: Optional[str] = None,
+                                      fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self.find_page("reward_transactions", {"user_id": user_id},
+                                    sort=[("created_at", -1)], limit=limit, cursor=cursor,
+                                    fields=fields)
 
 # Global database instance
 db = Database()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import math
+from typing import Optional, Dict, Any
+
+from location_store import location_store
+from responses import dumps
+
+# Drivers further than this from the pickup point are not offered the job
+OFFER_RADIUS_METERS = 10000
+SUBSCRIBER_QUEUE_SIZE = 100
+
+def haversine_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in meters"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode a hub event as a Server-Sent Events frame"""
+    return f"event: {event['event']}\ndata: {dumps(event['data']).decode()}\n\n"
+
+class JobHub:
+    """In-process pub/sub hub that pushes job offers to subscribed drivers.
+
+    Each streaming connection owns a bounded queue. Publishing is a fan-out
+    over the subscribers near the pickup point; a slow consumer loses its
+    oldest events instead of blocking the publisher.
+    """
+
+    def __init__(self, offer_radius: float = OFFER_RADIUS_METERS):
+        self.offer_radius = offer_radius
+        self._subscribers: Dict[str, asyncio.Queue] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, driver_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[driver_id] = queue
+        return queue
+
+    def unsubscribe(self, driver_id: str, queue: Optional[asyncio.Queue] = None):
+        # A reconnect may already have replaced this driver's queue
+        if queue is None or self._subscribers.get(driver_id) is queue:
+            self._subscribers.pop(driver_id, None)
+
+    def is_relevant(self, driver_id: str, booking: Dict[str, Any]) -> bool:
+        """Whether a driver should be offered a booking, based on the last known position"""
+        pickup_lat, pickup_lng = booking.get("pickup_lat"), booking.get("pickup_lng")
+        position = location_store.get(driver_id)
+        if pickup_lat is None or pickup_lng is None or position is None:
+            return True
+        distance = haversine_meters(position["current_lat"], position["current_lng"],
+                                    pickup_lat, pickup_lng)
+        return distance <= self.offer_radius
+
+    def _deliver(self, queue: asyncio.Queue, event: Dict[str, Any]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish_offer(self, booking: Dict[str, Any]) -> int:
+        """Push a newly requested booking to nearby drivers, returning the number notified"""
+        event = {"event": "job_offer", "data": booking}
+        notified = 0
+        for driver_id, queue in list(self._subscribers.items()):
+            if self.is_relevant(driver_id, booking):
+                self._deliver(queue, event)
+                notified += 1
+        return notified
+
+    def publish_taken(self, booking_id: str, driver_id: str):
+        """Tell every other subscriber that a job is no longer available"""
+        event = {"event": "job_taken", "data": {"booking_id": booking_id}}
+        for subscriber_id, queue in list(self._subscribers.items()):
+            if subscriber_id != driver_id:
+                self._deliver(queue, event)
+
+# Global job hub instance
+job_hub = JobHub()
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Ranking boost per location type; unlisted types rank after these
+TYPE_PRIORITY = {"airport": 2, "hotel": 1}
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# Trigram similarity a token needs to count as a typo match for a query token
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+# Shorter query tokens are matched by prefix only; their trigrams are too unspecific
+MIN_FUZZY_TOKEN_LENGTH = 3
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.ids: Set[str] = set()
+
+class LocationIndex:
+    """In-memory autocomplete over location name and address.
+
+    Every token of a location is inserted into a prefix trie whose nodes hold
+    the ids of all locations with a token starting there, so a prefix lookup
+    is one walk down the trie. When prefixes find too few results, query
+    tokens are compared with the indexed vocabulary through a trigram index
+    to tolerate typos. Results are
+    ranked by match quality, then the popular flag, then TYPE_PRIORITY.
+
+    The index is built at startup and patched per document through
+    db.on_change, so searches never touch Mongo.
+    """
+
+    def __init__(self):
+        self._locations: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self._trie = TrieNode()
+        self._token_ids: Dict[str, Set[str]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._loaded = False
+        # Strong references so pending refreshes are not garbage collected
+        self._refreshes: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._locations)
+
+    async def load(self):
+        locations = await db.find_documents("locations", limit=0)
+        self._locations.clear()
+        self._tokens.clear()
+        self._trie = TrieNode()
+        self._token_ids.clear()
+        self._trigrams.clear()
+        for location in locations:
+            self.add(location)
+        self._loaded = True
+
+    def add(self, location: Dict[str, Any]):
+        """Index a location, replacing any previous version with the same id"""
+        location_id = location["id"]
+        self.remove(location_id)
+        name_tokens = set(tokenize(location.get("name")))
+        address_tokens = set(tokenize(location.get("address"))) - name_tokens
+        self._locations[location_id] = location
+        self._tokens[location_id] = (name_tokens, address_tokens)
+        for token in name_tokens | address_tokens:
+            node = self._trie
+            for char in token:
+                node = node.children.setdefault(char, TrieNode())
+                node.ids.add(location_id)
+            if token not in self._token_ids:
+                self._token_ids[token] = set()
+                for gram in trigrams(token):
+                    self._trigrams.setdefault(gram, set()).add(token)
+            self._token_ids[token].add(location_id)
+
+    def remove(self, location_id: str):
+        tokens = self._tokens.pop(location_id, None)
+        self._locations.pop(location_id, None)
+        if tokens is None:
+            return
+        for token in tokens[0] | tokens[1]:
+            node = self._trie
+            for char in token:
+                child = node.children.get(char)
+                if child is None:
+                    break
+                child.ids.discard(location_id)
+                if not child.ids:
+                    del node.children[char]
+                    break
+                node = child
+            ids = self._token_ids.get(token)
+            if ids is None:
+                continue
+            ids.discard(location_id)
+            if not ids:
+                # Last location using this token; drop it from the vocabulary
+                del self._token_ids[token]
+                for gram in trigrams(token):
+                    tokens = self._trigrams.get(gram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigrams[gram]
+
+    async def refresh(self, location_id: str):
+        """Re-read one location after it changed, dropping it if it was deleted"""
+        location = await db.get_document("locations", location_id)
+        if location:
+            self.add(location)
+        else:
+            self.remove(location_id)
+
+    def on_change(self, location_id: str):
+        # Scripts that write locations without serving searches never load the index
+        if self._loaded:
+            task = asyncio.ensure_future(self.refresh(location_id))
+            self._refreshes.add(task)
+            task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Location index refresh failed; index may be stale until reload",
+                         exc_info=task.exception())
+
+    def _prefix_ids(self, prefix: str) -> Set[str]:
+        node = self._trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _fuzzy_ids(self, query_token: str) -> Dict[str, float]:
+        """Locations with a token similar to query_token, mapped to the best similarity"""
+        if len(query_token) < MIN_FUZZY_TOKEN_LENGTH:
+            return {}
+        grams = trigrams(query_token)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        scores: Dict[str, float] = {}
+        for token, count in shared.items():
+            # Dice coefficient over the two trigram sets
+            similarity = 2 * count / (len(grams) + len(token) + 1)
+            if similarity < MIN_TRIGRAM_SIMILARITY:
+                continue
+            for location_id in self._token_ids[token]:
+                if similarity > scores.get(location_id, 0.0):
+                    scores[location_id] = similarity
+        return scores
+
+    def _rank(self, location_id: str, query_tokens: List[str], quality: float) -> tuple:
+        location = self._locations[location_id]
+        name_tokens = self._tokens[location_id][0]
+        in_name = all(any(token.startswith(q) for token in name_tokens) for q in query_tokens)
+        return (
+            -quality,
+            not in_name,
+            not location.get("name", "").lower().startswith(query_tokens[0]),
+            not location.get("popular", False),
+            -TYPE_PRIORITY.get(location.get("type"), 0),
+            location.get("name", "")
+        )
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Locations whose name or address tokens start with every query token"""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+        matches: Optional[Set[str]] = None
+        for token in query_tokens:
+            ids = self._prefix_ids(token)
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        scored = {location_id: 1.0 for location_id in matches or ()}
+
+        if len(scored) < limit:
+            # Typo fallback: every query token needs a close-enough token in the location
+            fuzzy: Optional[Dict[str, float]] = None
+            for token in query_tokens:
+                similar = self._fuzzy_ids(token)
+                if fuzzy is None:
+                    fuzzy = similar
+                else:
+                    fuzzy = {location_id: min(score, similar[location_id])
+                             for location_id, score in fuzzy.items() if location_id in similar}
+                if not fuzzy:
+                    break
+            for location_id, score in (fuzzy or {}).items():
+                scored.setdefault(location_id, score * 0.9)
+
+        ranked = sorted(scored, key=lambda location_id: self._rank(
+            location_id, query_tokens, scored[location_id]))
+        return [self._locations[location_id] for location_id in ranked[:limit]]
+
+# Global location index instance
+location_index = LocationIndex()
+db.on_change("locations", location_index.on_change)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from pymongo.write_concern import WriteConcern
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Position tuple: (lat, lng, recorded_at)
+Position = Tuple[float, float, datetime]
+
+def parse_write_concern(value: str) -> WriteConcern:
+    """Parse a write concern setting such as "1", "0" or "majority" """
+    value = (value or "1").strip()
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+class LocationStore:
+    """In-process fleet location store with write-behind persistence.
+
+    Location pings are applied to an in-memory map keyed by driver id and
+    flushed to the drivers collection in one bulk_write per interval. Only the
+    latest position per driver is written, so a driver pinging every few
+    seconds costs one Mongo update per flush at most.
+    """
+
+    def __init__(self, flush_interval: float = 2.0, write_concern: str = "1"):
+        self.flush_interval = flush_interval
+        self.write_concern = parse_write_concern(write_concern)
+        self._positions: Dict[str, Position] = {}
+        self._dirty: Dict[str, Position] = {}
+        self._driver_ids: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, driver_id: str, lat: float, lng: float,
+               recorded_at: Optional[datetime] = None) -> Position:
+        """Record the latest position for a driver, stamped now unless recorded_at is given"""
+        position = (float(lat), float(lng), recorded_at or datetime.utcnow())
+        self._positions[driver_id] = position
+        self._dirty[driver_id] = position
+        return position
+
+    def get(self, driver_id: str) -> Optional[Dict[str, Any]]:
+        """Latest known position for a driver, or None if none was reported"""
+        position = self._positions.get(driver_id)
+        if position is None:
+            return None
+        lat, lng, recorded_at = position
+        return {
+            "current_lat": lat,
+            "current_lng": lng,
+            "location_updated_at": recorded_at
+        }
+
+    def last_recorded_at(self, driver_id: str) -> Optional[datetime]:
+        position = self._positions.get(driver_id)
+        return position[2] if position else None
+
+    def driver_id_for(self, user_id: str) -> Optional[str]:
+        return self._driver_ids.get(user_id)
+
+    def remember_driver(self, user_id: str, driver_id: str):
+        self._driver_ids[user_id] = driver_id
+
+    def forget(self, driver_id: str):
+        self._positions.pop(driver_id, None)
+        self._dirty.pop(driver_id, None)
+
+    async def flush(self) -> int:
+        """Write all pending positions in a single bulk_write"""
+        if not self._dirty:
+            return 0
+
+        pending, self._dirty = self._dirty, {}
+        operations = [
+            UpdateOne({"id": driver_id}, {"$set": {
+                "current_lat": lat,
+                "current_lng": lng,
+                "location": db.geo_point(lat, lng),
+                "location_updated_at": recorded_at
+            }})
+            for driver_id, (lat, lng, recorded_at) in pending.items()
+        ]
+
+        collection = db.db.drivers.with_options(write_concern=self.write_concern)
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except PyMongoError:
+            # Requeue anything that has not been superseded by a newer ping
+            for driver_id, position in pending.items():
+                self._dirty.setdefault(driver_id, position)
+            raise
+        return len(operations)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                logger.warning("Location flush failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+# Global location store instance
+location_store = LocationStore(
+    flush_interval=float(os.environ.get("LOCATION_FLUSH_INTERVAL", "2.0")),
+    write_concern=os.environ.get("LOCATION_WRITE_CONCERN", "1")
+)
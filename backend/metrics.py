@@ -0,0 +1,163 @@
+import functools
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Scrapers must send this as a bearer token when it is set
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two additions"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metrics:
+    """In-process counters and histograms rendered in the Prometheus text format.
+
+    Everything is updated from the event loop thread, so plain dicts and ints
+    are enough and recording a sample costs a couple of dict lookups.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: Labels, value: float = 1):
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels: Labels, seconds: float):
+        series = self._histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        self.observe("http_request_duration_seconds", (("method", method), ("route", route)), seconds)
+        self.inc("http_requests_total", (("method", method), ("route", route), ("status", str(status))))
+
+    def observe_query(self, collection: str, operation: str, seconds: float, documents: int):
+        labels = (("collection", collection), ("operation", operation))
+        self.observe("db_operation_duration_seconds", labels, seconds)
+        self.inc("db_operation_documents_total", labels, documents)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, series in self._counters.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for name, series in self._histograms.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                    cumulative += count
+                    bucket = format_labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                bucket = format_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def document_count(result: Any) -> int:
+    """Number of documents a Database method read or wrote"""
+    if result is None or result is False:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return len(result["items"]) if isinstance(result.get("items"), list) else 1
+    return 1
+
+def timed(collection: Optional[str] = None):
+    """Record latency and document count for an async Database method.
+
+    The collection label is the fixed collection given here, or else the
+    method's first argument, as in the generic CRUD helpers.
+    """
+    def decorator(func):
+        operation = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            label = collection or (args[0] if args else kwargs.get("collection", "unknown"))
+            start = time.perf_counter()
+            result = None
+            try:
+                result = await func(self, *args, **kwargs)
+                return result
+            finally:
+                metrics.observe_query(label, operation, time.perf_counter() - start,
+                                      document_count(result))
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route template.
+
+    The route is read from the scope after the router has matched it, so
+    /api/bookings/{booking_id} is one series however many ids are requested.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            metrics.observe_request(scope["method"], getattr(route, "path", "unmatched"),
+                                    status_code, time.perf_counter() - start)
+
+# Global metrics instance
+metrics = Metrics()
+metrics.describe("http_requests_total", "HTTP responses by method, route template and status")
+metrics.describe("http_request_duration_seconds", "HTTP request latency by method and route template")
+metrics.describe("db_operation_documents_total", "Documents read or written by Database method")
+metrics.describe("db_operation_duration_seconds", "Database method latency by collection and operation")
@@ -0,0 +1,18 @@
+import asyncio
+from database import db
+
+async def migrate_dates():
+    """Convert timestamp fields stored as ISO strings to native BSON dates"""
+    
+    await db.connect()
+    try:
+        migrated = await db.migrate_datetime_fields()
+        for collection, count in migrated.items():
+            if count:
+                print(f"{collection}: converted {count} field values")
+        print("Date migration completed successfully!")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_dates())
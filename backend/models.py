@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, conint
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, time
 from enum import Enum
@@ -58,6 +58,8 @@ class UserProfile(BaseModel):
     preferences: Dict[str, Any] = {}
     loyalty_points: int = 0
     total_rides: int = 0
+    reward_balance: float = 0.0  # Running total of reward_transactions amounts
+    reward_totals: Dict[str, float] = {}  # Per transaction type subtotals
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Vehicle Models
@@ -107,6 +109,7 @@ class BookingCreate(BaseModel):
     return_time: Optional[time] = None  # Only for rental service
     passengers: int
     vehicle_type: str
+    vehicle_id: Optional[str] = None  # Specific vehicle; otherwise any free one of vehicle_type
     extras: List[str] = []
     payment_method: PaymentMethod
     promo_code: Optional[str] = None
@@ -140,6 +143,10 @@ class Booking(BaseModel):
     actual_cost: Optional[float] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    # Driven route, simplified and encoded as a Google polyline at completion
+    route_polyline: Optional[str] = None
+    route_distance_meters: Optional[float] = None
+    route_raw_points: Optional[int] = None
     passenger_name: Optional[str] = None
     passenger_phone: Optional[str] = None
     status: BookingStatus = BookingStatus.PENDING
@@ -170,6 +177,14 @@ class PriceEstimate(BaseModel):
     total_price: float
     breakdown: Dict[str, Any]
 
+class BatchPriceEstimateRequest(BaseModel):
+    vehicle_types: List[str]
+    service_type: str  # "chauffeur" or "rental"
+    durations: List[conint(gt=0)] = Field([1], max_length=100)  # hours for chauffeur, days for rental
+    extras: List[str] = []
+    payment_methods: List[PaymentMethod] = list(PaymentMethod)
+    promo_code: Optional[str] = None
+
 class PricingRule(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     vehicle_type: str
@@ -270,6 +285,17 @@ class DriverCreate(BaseModel):
     license_number: str
     vehicle_id: Optional[str] = None
 
+class GPSFix(BaseModel):
+    lat: float
+    lng: float
+    recorded_at: datetime  # Device time of the fix
+    accuracy: Optional[float] = None  # Meters
+    speed: Optional[float] = None  # Meters per second
+    heading: Optional[float] = None  # Degrees from north
+
+class GPSFixBatch(BaseModel):
+    fixes: List[GPSFix]  # Oldest first
+
 # Rewards Models
 class RewardTransaction(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -280,6 +306,13 @@ class RewardTransaction(BaseModel):
     description: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class RewardTransactionCreate(BaseModel):
+    user_id: str
+    booking_id: Optional[str] = None
+    amount: float
+    type: str = Field(pattern=r"^[a-z_]+$")
+    description: str
+
 class StakingPool(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+from types import MappingProxyType
+import numpy as np
+from typing import Optional, Dict, Any, List, Mapping, Tuple
+
+from database import db
+from models import PriceEstimate
+
+logger = logging.getLogger(__name__)
+
+# Discount applied to the subtotal for each payment method
+PAYMENT_DISCOUNTS = {
+    "icp": 0.15,
+    "usdt": 0.10,
+    "btc": 0.10,
+    "eth": 0.10,
+    "card": 0.0
+}
+
+class PricingTable:
+    """Immutable snapshot of everything needed to price a booking"""
+
+    __slots__ = ("rules", "extras", "payment_discounts")
+
+    def __init__(self, rules: Mapping[str, Tuple[float, float]], extras: Mapping[str, float],
+                 payment_discounts: Mapping[str, float]):
+        self.rules = MappingProxyType(dict(rules))
+        self.extras = MappingProxyType(dict(extras))
+        self.payment_discounts = MappingProxyType(dict(payment_discounts))
+
+    def __eq__(self, other):
+        return (isinstance(other, PricingTable)
+                and self.rules == other.rules
+                and self.extras == other.extras
+                and self.payment_discounts == other.payment_discounts)
+
+    @classmethod
+    def from_documents(cls, pricing_rules: List[Dict[str, Any]],
+                       extras: List[Dict[str, Any]]) -> "PricingTable":
+        rules = {}
+        for rule in pricing_rules:
+            # First rule per vehicle type wins, matching the old find()[0] lookup
+            rules.setdefault(rule["vehicle_type"],
+                             (rule["base_price_hourly"], rule["base_price_daily"]))
+        return cls(rules, {extra["name"]: extra["price"] for extra in extras}, PAYMENT_DISCOUNTS)
+
+class PricingEngine:
+    """Prices bookings against an in-memory PricingTable.
+
+    The table is loaded at startup and swapped wholesale when pricing data
+    changes, so readers never see a half-updated table and quoting needs no
+    database reads apart from promo code validation.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self.table = PricingTable({}, {}, PAYMENT_DISCOUNTS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self) -> bool:
+        """Reload pricing data, returning True if the table changed"""
+        pricing_rules, extras = await asyncio.gather(
+            db.find_documents("pricing_rules", limit=0),
+            db.find_documents("extras", limit=0)
+        )
+        table = PricingTable.from_documents(pricing_rules, extras)
+        if table == self.table:
+            return False
+        self.table = table
+        return True
+
+    def has_vehicle_type(self, vehicle_type: str) -> bool:
+        return vehicle_type in self.table.rules
+
+    def quote(self, vehicle_type: str, service_type: str, duration_hours: Optional[int] = 1,
+              duration_days: Optional[int] = None, extras: List[str] = (),
+              payment_method: str = "card", promo: Optional[Dict[str, Any]] = None) -> PriceEstimate:
+        """Price a booking; raises KeyError for an unknown vehicle type"""
+        table = self.table
+        hourly, daily = table.rules[vehicle_type]
+
+        if service_type == "rental" and duration_days:
+            base_price = daily * duration_days
+        else:
+            base_price = hourly * (duration_hours or 1)
+
+        extras_price = sum(table.extras.get(extra, 0) for extra in extras)
+        subtotal = base_price + extras_price
+
+        # PaymentMethod members hash by name, so look up by their value
+        payment_method = getattr(payment_method, "value", payment_method)
+        payment_discount_amount = subtotal * table.payment_discounts.get(payment_method, 0.0)
+        promo_discount_amount = subtotal * promo["discount_percentage"] if promo else 0
+
+        total_discount = payment_discount_amount + promo_discount_amount
+        total_price = max(0, subtotal - total_discount)
+
+        return PriceEstimate(
+            base_price=base_price,
+            extras_price=extras_price,
+            discount_amount=total_discount,
+            total_price=total_price,
+            breakdown={
+                "base_price": base_price,
+                "extras_price": extras_price,
+                "subtotal": subtotal,
+                "payment_discount": payment_discount_amount,
+                "promo_discount": promo_discount_amount,
+                "total_discount": total_discount,
+                "total_price": total_price
+            }
+        )
+
+    def quote_matrix(self, vehicle_types: List[str], service_type: str, durations: List[int],
+                     extras: List[str] = (), payment_methods: List[str] = (),
+                     promo: Optional[Dict[str, Any]] = None) -> List[List[List[Dict[str, Any]]]]:
+        """Price every vehicle type x duration x payment method combination in one pass.
+
+        Returns a nested [vehicle][duration][payment method] list of
+        PriceEstimate-shaped dicts with the same values quote() would give.
+        """
+        table = self.table
+        hourly = np.array([table.rules[v][0] for v in vehicle_types], dtype=float)
+        daily = np.array([table.rules[v][1] for v in vehicle_types], dtype=float)
+        duration = np.array(durations, dtype=float)
+        discounts = np.array([table.payment_discounts.get(getattr(m, "value", m), 0.0)
+                              for m in payment_methods], dtype=float)
+
+        # (V, D): daily rate for rentals with a duration, hourly rate otherwise
+        if service_type == "rental":
+            base = np.where(duration != 0, daily[:, None] * duration, hourly[:, None])
+        else:
+            base = hourly[:, None] * np.where(duration != 0, duration, 1.0)
+        extras_price = float(sum(table.extras.get(extra, 0) for extra in extras))
+        subtotal = base + extras_price
+
+        # (V, D, P)
+        payment_discount = subtotal[:, :, None] * discounts
+        promo_discount = subtotal * promo["discount_percentage"] if promo else np.zeros_like(subtotal)
+        total_discount = payment_discount + promo_discount[:, :, None]
+        total = np.maximum(0, subtotal[:, :, None] - total_discount)
+
+        base, subtotal, promo_discount = base.tolist(), subtotal.tolist(), promo_discount.tolist()
+        payment_discount, total_discount, total = (
+            payment_discount.tolist(), total_discount.tolist(), total.tolist())
+        return [
+            [
+                [
+                    {
+                        "base_price": base[v][d],
+                        "extras_price": extras_price,
+                        "discount_amount": total_discount[v][d][p],
+                        "total_price": total[v][d][p],
+                        "breakdown": {
+                            "base_price": base[v][d],
+                            "extras_price": extras_price,
+                            "subtotal": subtotal[v][d],
+                            "payment_discount": payment_discount[v][d][p],
+                            "promo_discount": promo_discount[v][d],
+                            "total_discount": total_discount[v][d][p],
+                            "total_price": total[v][d][p]
+                        }
+                    }
+                    for p in range(len(payment_methods))
+                ]
+                for d in range(len(durations))
+            ]
+            for v in range(len(vehicle_types))
+        ]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if await self.load():
+                    logger.info("Pricing table reloaded")
+            except Exception as e:
+                logger.warning("Pricing reload failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global pricing engine instance
+pricing_engine = PricingEngine(
+    refresh_interval=float(os.environ.get("PRICING_REFRESH_INTERVAL", "60"))
+)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Commands whose plan can be explained; anything else is recorded without one
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Commands that are never interesting, however long they take
+IGNORED_COMMANDS = {"ping", "hello", "isMaster", "ismaster", "endSessions", "explain",
+                    "getMore", "killCursors", "saslStart", "saslContinue", "buildInfo"}
+
+# Driver-added fields that explain does not accept
+SESSION_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference",
+                  "readConcern", "writeConcern", "autocommit", "startTransaction"}
+
+def filter_shape(value: Any) -> Any:
+    """Replace literal values with "?" but keep field names, operators and $field refs"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(item) for item in value]
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+def command_shape(name: str, command: Dict[str, Any]) -> Any:
+    """The part of a command that identifies its query shape"""
+    if name in ("find", "count", "distinct"):
+        return filter_shape(command.get("filter", command.get("query", {})))
+    if name == "findAndModify":
+        return filter_shape(command.get("query", {}))
+    if name == "aggregate":
+        return filter_shape(command.get("pipeline", []))
+    if name == "update":
+        return [filter_shape(update.get("q", {})) for update in command.get("updates", [])[:1]]
+    if name == "delete":
+        return [filter_shape(delete.get("q", {})) for delete in command.get("deletes", [])[:1]]
+    return None
+
+def first_statement(name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """A bulk update/delete cut down to its first statement, as explain only takes one"""
+    field = {"update": "updates", "delete": "deletes"}.get(name)
+    if field is None or len(command.get(field, ())) <= 1:
+        return command
+    return {**command, field: command[field][:1]}
+
+class SlowQueryMonitor(monitoring.CommandListener):
+    """Command listener that keeps the most recent slow commands in a ring buffer.
+
+    Every command is timed by the driver; the ones over threshold_ms are
+    recorded with their collection and filter shape (values are stripped).
+    A sampled fraction is also explained in the background so the entry
+    shows which plan the server picked. Each shape is explained at most once
+    per explain_cooldown seconds.
+
+    pymongo calls listeners from Motor's worker threads, so this only
+    touches thread-safe structures and hands explains to the event loop.
+    """
+
+    def __init__(self, threshold_ms: float = 100, capacity: int = 200,
+                 explain_sample_rate: float = 0.1, explain_cooldown: float = 300):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_cooldown = explain_cooldown
+        self._entries: deque = deque(maxlen=capacity)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Optional[str], Dict[str, Any]]] = {}
+        self._explained: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._explain: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, explain: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """Enable explain sampling; must be called from the event loop"""
+        self._explain = explain
+        self._loop = asyncio.get_running_loop()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        name = event.command_name
+        if name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            name, collection if isinstance(collection, str) else None,
+            {key: value for key, value in command.items() if key not in SESSION_FIELDS}
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            self._record(pending, event.duration_micros / 1000)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            self._record(pending, event.duration_micros / 1000, error=str(event.failure.get("errmsg", "")))
+
+    def _record(self, pending: tuple, duration_ms: float, error: Optional[str] = None):
+        if duration_ms < self.threshold_ms:
+            return
+        name, collection, command = pending
+        entry = {
+            "recorded_at": datetime.utcnow(),
+            "command": name,
+            "collection": collection,
+            "duration_ms": round(duration_ms, 2),
+            "shape": command_shape(name, command),
+            "explain": None
+        }
+        if error is not None:
+            entry["error"] = error
+        self._entries.append(entry)
+        if name in EXPLAINABLE_COMMANDS and error is None:
+            self._maybe_explain(entry, first_statement(name, command))
+
+    def _maybe_explain(self, entry: Dict[str, Any], command: Dict[str, Any]):
+        if self._explain is None or self._loop is None or self._loop.is_closed():
+            return
+        key = f"{entry['command']}:{entry['collection']}:{entry['shape']}"
+        cached = self._explained.get(key)
+        if cached and time.monotonic() - cached[0] < self.explain_cooldown:
+            entry["explain"] = cached[1]
+            return
+        if random.random() >= self.explain_sample_rate:
+            return
+        # Claim the shape now so concurrent slow runs do not all explain it
+        self._explained[key] = (time.monotonic(), None)
+        self._loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self._run_explain(key, entry, command)))
+
+    async def _run_explain(self, key: str, entry: Dict[str, Any], command: Dict[str, Any]):
+        try:
+            summary = await self._explain(command)
+        except Exception as e:
+            summary = {"error": str(e)}
+            logger.warning("Explain for slow %s on %s failed: %s",
+                           entry["command"], entry["collection"], e)
+        entry["explain"] = summary
+        self._explained[key] = (time.monotonic(), summary)
+        if len(self._explained) > 1000:
+            self._explained.clear()
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recorded slow commands, newest first"""
+        entries = list(reversed(self._entries))
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        self._entries.clear()
+
+# Global slow query monitor instance
+slow_query_monitor = SlowQueryMonitor(
+    threshold_ms=float(os.environ.get("SLOW_QUERY_MS", "100")),
+    capacity=int(os.environ.get("SLOW_QUERY_BUFFER_SIZE", "200")),
+    explain_sample_rate=float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+)
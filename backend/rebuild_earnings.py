@@ -0,0 +1,15 @@
+import asyncio
+from database import db
+
+async def rebuild_earnings():
+    """Recompute driver earnings counters and rollups from completed bookings"""
+    
+    await db.connect()
+    try:
+        written = await db.rebuild_driver_earnings()
+        print(f"Earnings rebuild completed: {written} rollup documents written")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_earnings())
@@ -0,0 +1,15 @@
+import asyncio
+from database import db
+
+async def reconcile_rewards():
+    """Rebuild user_profiles reward balances from the reward_transactions ledger"""
+    
+    await db.connect()
+    try:
+        modified = await db.reconcile_reward_balances()
+        print(f"Reward reconciliation completed: {modified} profiles updated")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(reconcile_rewards())
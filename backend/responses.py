@@ -0,0 +1,40 @@
+import json
+import os
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+from models import APIResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+# Opt-in: return pre-encoded envelopes instead of revalidating through APIResponse
+FAST_RESPONSES = os.environ.get("FAST_RESPONSES", "").lower() in ("1", "true", "yes")
+
+def dumps(content: Any) -> bytes:
+    """Encode trusted API data as compact JSON, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, separators=(",", ":")).encode()
+
+class FastJSONResponse(Response):
+    """JSON response rendered with the fast encoder and no jsonable_encoder pass"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def envelope(message: str, data: Optional[Any] = None, success: bool = True):
+    """Build the {success, message, data} envelope for a route.
+
+    With FAST_RESPONSES enabled this returns a FastJSONResponse, which
+    FastAPI sends as-is, skipping response_model validation and encoding.
+    Only use it for data that came from the database or our own models.
+    """
+    if FAST_RESPONSES:
+        return FastJSONResponse({"success": success, "message": message, "data": data})
+    return APIResponse(success=success, message=message, data=data)
@@ -1,7 +1,15 @@
+import argparse
 import asyncio
+import random
 from database import db
 from models import *
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
+
+# Password shared by every synthetic user, so load tests can log in as any of them
+SYNTHETIC_PASSWORD = "loadtest-password"
+# Synthetic drivers and trips are scattered around this point (San Francisco)
+SYNTHETIC_CENTER = (37.7749, -122.4194)
+SYNTHETIC_SPREAD_DEGREES = 0.15
 
 async def seed_database():
     """Seed the database with initial data"""
@@ -96,9 +104,6 @@ async def seed_database():
         }
     ]
     
-    for vehicle_data in vehicles_data:
-        await db.create_document("vehicles", vehicle_data)
-    
     # Seed Locations
     locations_data = [
         {"id": "sfo", "name": "San Francisco Airport (SFO)", "address": "San Francisco, CA", "type": "airport", "popular": True},
@@ -115,9 +120,6 @@ async def seed_database():
         {"id": "financial-district", "name": "Financial District", "address": "San Francisco, CA", "type": "business", "popular": False}
     ]
     
-    for location_data in locations_data:
-        await db.create_document("locations", location_data)
-    
     # Seed Services
     services_data = [
         {
@@ -149,9 +151,6 @@ async def seed_database():
         }
     ]
     
-    for service_data in services_data:
-        await db.create_document("services", service_data)
-    
     # Seed Pricing Rules
     pricing_rules_data = [
         {"id": "economy-pricing", "vehicle_type": "Economy", "base_price_hourly": 45, "base_price_daily": 320, "distance_rate": 2.5},
@@ -161,9 +160,6 @@ async def seed_database():
         {"id": "marine-pricing", "vehicle_type": "Marine", "base_price_hourly": 285, "base_price_daily": 2200, "distance_rate": 0}
     ]
     
-    for pricing_data in pricing_rules_data:
-        await db.create_document("pricing_rules", pricing_data)
-    
     # Seed Extras
     extras_data = [
         {"id": "child-seat", "name": "childSeat", "price": 15, "description": "Child safety seat"},
@@ -172,9 +168,6 @@ async def seed_database():
         {"id": "wifi-hotspot", "name": "wifi", "price": 5, "description": "WiFi hotspot service"}
     ]
     
-    for extra_data in extras_data:
-        await db.create_document("extras", extra_data)
-    
     # Seed Promo Codes
     promo_codes_data = [
         {
@@ -182,8 +175,8 @@ async def seed_database():
             "code": "RIIDE20",
             "discount_percentage": 0.20,
             "description": "20% off first ride",
-            "valid_from": "2025-01-01T00:00:00",
-            "valid_to": "2025-12-31T23:59:59",
+            "valid_from": datetime(2025, 1, 1),
+            "valid_to": datetime(2025, 12, 31, 23, 59, 59),
             "usage_limit": 1000,
             "used_count": 0,
             "active": True
@@ -193,8 +186,8 @@ async def seed_database():
             "code": "LAUNCH50",
             "discount_percentage": 0.50,
             "description": "50% off launch special",
-            "valid_from": "2025-01-01T00:00:00",
-            "valid_to": "2025-03-31T23:59:59",
+            "valid_from": datetime(2025, 1, 1),
+            "valid_to": datetime(2025, 3, 31, 23, 59, 59),
             "usage_limit": 500,
             "used_count": 0,
             "active": True
@@ -204,17 +197,14 @@ async def seed_database():
             "code": "STUDENT15",
             "discount_percentage": 0.15,
             "description": "15% student discount",
-            "valid_from": "2025-01-01T00:00:00",
-            "valid_to": "2025-12-31T23:59:59",
+            "valid_from": datetime(2025, 1, 1),
+            "valid_to": datetime(2025, 12, 31, 23, 59, 59),
             "usage_limit": 2000,
             "used_count": 0,
             "active": True
         }
     ]
     
-    for promo_data in promo_codes_data:
-        await db.create_document("promo_codes", promo_data)
-    
     # Seed Testimonials
     testimonials_data = [
         {
@@ -246,9 +236,6 @@ async def seed_database():
         }
     ]
     
-    for testimonial_data in testimonials_data:
-        await db.create_document("testimonials", testimonial_data)
-    
     # Seed Blog Posts
     blog_posts_data = [
         {
@@ -289,9 +276,6 @@ async def seed_database():
         }
     ]
     
-    for blog_data in blog_posts_data:
-        await db.create_document("blog_posts", blog_data)
-    
     # Seed FAQs
     faqs_data = [
         {
@@ -331,10 +315,159 @@ async def seed_database():
         }
     ]
     
-    for faq_data in faqs_data:
-        await db.create_document("faqs", faq_data)
+    # One bulk insert per collection, all collections at once
+    await asyncio.gather(
+        db.create_documents("vehicles", vehicles_data),
+        db.create_documents("locations", locations_data),
+        db.create_documents("services", services_data),
+        db.create_documents("pricing_rules", pricing_rules_data),
+        db.create_documents("extras", extras_data),
+        db.create_documents("promo_codes", promo_codes_data),
+        db.create_documents("testimonials", testimonials_data),
+        db.create_documents("blog_posts", blog_posts_data),
+        db.create_documents("faqs", faqs_data)
+    )
     
     print("Database seeding completed successfully!")
 
+def generate_synthetic_data(users: int = 1000, drivers: int = 200, bookings: int = 10000,
+                            reward_transactions: int = 20000,
+                            seed: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Generate a realistic large dataset, keyed by collection name.
+
+    Users share SYNTHETIC_PASSWORD and have emails user<N>@loadtest.riide.
+    Drivers get coordinates around SYNTHETIC_CENTER, bookings cover every
+    BookingStatus over the past year, and reward transactions reference
+    random users and completed bookings.
+    """
+    from auth import pwd_context  # bcrypt once, not per user
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = pwd_context.hash(SYNTHETIC_PASSWORD)
+    center_lat, center_lng = SYNTHETIC_CENTER
+    
+    def random_point():
+        return (center_lat + rng.uniform(-SYNTHETIC_SPREAD_DEGREES, SYNTHETIC_SPREAD_DEGREES),
+                center_lng + rng.uniform(-SYNTHETIC_SPREAD_DEGREES, SYNTHETIC_SPREAD_DEGREES))
+    
+    def random_past(days: int = 365):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+    
+    user_docs, profile_docs = [], []
+    for i in range(users):
+        created_at = random_past()
+        user = User(email=f"user{i}@loadtest.riide", name=f"Load Test User {i}",
+                    phone=f"+1555{i:07d}", created_at=created_at, updated_at=created_at).dict()
+        user["password_hash"] = password_hash
+        user_docs.append(user)
+        profile_docs.append(UserProfile(user_id=user["id"], created_at=created_at).dict())
+    
+    driver_docs = []
+    driver_users = rng.sample(user_docs, min(drivers, len(user_docs)))
+    for i, user in enumerate(driver_users):
+        lat, lng = random_point()
+        driver = Driver(user_id=user["id"], license_number=f"LT{i:08d}",
+                        status=rng.choice(list(DriverStatus)), rating=round(rng.uniform(4.0, 5.0), 2),
+                        current_lat=lat, current_lng=lng, created_at=random_past()).dict()
+        driver["driver_online"] = driver["status"] != DriverStatus.OFFLINE
+        driver["location"] = db.geo_point(lat, lng)
+        driver_docs.append(driver)
+    
+    vehicle_types = ["Premium", "SUV", "Van", "Economy"]
+    # Without drivers, only statuses that never had one assigned
+    statuses = list(BookingStatus) if driver_docs else [
+        BookingStatus.PENDING, BookingStatus.REQUESTED, BookingStatus.CANCELLED]
+    booking_docs = []
+    for _ in range(bookings):
+        created_at = random_past()
+        status = rng.choice(statuses)
+        pickup_lat, pickup_lng = random_point()
+        drop_lat, drop_lng = random_point()
+        base_price = float(rng.choice([65, 85, 95, 120]) * rng.randint(1, 4))
+        booking = Booking(
+            user_id=rng.choice(user_docs)["id"],
+            pickup_location=f"{rng.randint(1, 9999)} Market Street, San Francisco",
+            destination=f"{rng.randint(1, 9999)} Mission Street, San Francisco",
+            pickup_date=(created_at + timedelta(days=rng.randint(0, 14))).date(),
+            pickup_time=time(rng.randint(0, 23), rng.choice([0, 15, 30, 45])),
+            passengers=rng.randint(1, 4),
+            vehicle_type=rng.choice(vehicle_types),
+            payment_method=rng.choice(list(PaymentMethod)),
+            base_price=base_price,
+            extras_price=0.0,
+            total_price=base_price,
+            pickup_lat=pickup_lat, pickup_lng=pickup_lng,
+            drop_lat=drop_lat, drop_lng=drop_lng,
+            status=status,
+            created_at=created_at,
+            updated_at=created_at
+        ).dict()
+        if status not in (BookingStatus.PENDING, BookingStatus.REQUESTED) and driver_docs:
+            booking["driver_id"] = rng.choice(driver_docs)["id"]
+            booking["started_at"] = created_at + timedelta(minutes=rng.randint(1, 30))
+        if status == BookingStatus.COMPLETED:
+            booking["actual_cost"] = base_price
+            booking["completed_at"] = booking["started_at"] + timedelta(minutes=rng.randint(10, 120))
+        booking_docs.append(booking)
+    
+    completed = [b for b in booking_docs if b["status"] == BookingStatus.COMPLETED]
+    reward_docs = []
+    for _ in range(reward_transactions):
+        reward_type = rng.choice(["ride_reward", "referral", "staking"])
+        booking = rng.choice(completed) if reward_type == "ride_reward" and completed else None
+        reward_docs.append(RewardTransaction(
+            user_id=booking["user_id"] if booking else rng.choice(user_docs)["id"],
+            booking_id=booking["id"] if booking else None,
+            amount=round(rng.uniform(1, 50), 2),
+            type=reward_type,
+            description=f"Synthetic {reward_type.replace('_', ' ')}",
+            created_at=random_past()
+        ).dict())
+    
+    return {
+        "users": user_docs,
+        "user_profiles": profile_docs,
+        "drivers": driver_docs,
+        "bookings": booking_docs,
+        "reward_transactions": reward_docs
+    }
+
+async def seed_synthetic_data(**counts):
+    """Generate a synthetic dataset and bulk-insert it, all collections concurrently"""
+    
+    print("Generating synthetic data...")
+    data = generate_synthetic_data(**counts)
+    await asyncio.gather(*(
+        db.create_documents(collection, documents) for collection, documents in data.items()
+    ))
+    for collection, documents in data.items():
+        print(f"  {collection}: {len(documents)}")
+    # Ledgers were bulk-inserted, so materialize balances and rollups in one pass
+    await db.reconcile_reward_balances()
+    await db.rebuild_driver_earnings()
+    print("Synthetic data seeding completed successfully!")
+
+async def main(args):
+    await db.connect()
+    try:
+        if args.synthetic:
+            await seed_synthetic_data(users=args.users, drivers=args.drivers,
+                                      bookings=args.bookings,
+                                      reward_transactions=args.reward_transactions,
+                                      seed=args.seed)
+        else:
+            await seed_database()
+    finally:
+        await db.close()
+
 if __name__ == "__main__":
-    asyncio.run(seed_database())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the RIIDE database")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="load a generated large dataset instead of the initial content")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--drivers", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--reward-transactions", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
@@ -1,8 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
+import hmac
+import math
 import logging
 from pathlib import Path
 from typing import List, Optional
@@ -10,8 +14,18 @@ from datetime import datetime, timedelta
 
 # Import our modules
 from models import *
-from database import db
+from database import db, DEFAULT_PAGE_SIZE, STREAM_BATCH_SIZE
 from auth import get_current_user, get_current_user_optional, authenticate_user, create_user_account, create_access_token
+from location_store import location_store
+from job_hub import job_hub, format_sse
+from cache import content_cache, cached_response
+from pricing import pricing_engine
+from location_index import location_index, DEFAULT_SEARCH_LIMIT
+from availability import vehicle_availability, booking_window
+from tracks import track_store, trip_tracker, MAX_FIXES_PER_BATCH
+from responses import envelope, dumps
+from metrics import metrics, MetricsMiddleware, METRICS_TOKEN
+from query_monitor import slow_query_monitor
 import seed_data
 
 ROOT_DIR = Path(__file__).parent
@@ -26,6 +40,56 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 
+# Bearer token for /api/admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Largest cursor batch an export may request
+MAX_STREAM_BATCH_SIZE = 5000
+
+def ndjson_response(documents, batch_size: int) -> StreamingResponse:
+    """Stream an async iterable of documents as newline-delimited JSON.
+
+    Lines are flushed in groups of batch_size so memory stays flat and each
+    cursor batch becomes roughly one chunk on the wire.
+    """
+    async def encode():
+        lines = []
+        async for doc in documents:
+            lines.append(dumps(doc))
+            if len(lines) >= batch_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    
+    return StreamingResponse(encode(), media_type="application/x-ndjson")
+
+def parse_fields(fields: Optional[str], model) -> Optional[tuple]:
+    """Validate a comma-separated ?fields= list against a model's fields.
+
+    Returns None when no projection was requested; id is always included.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(sorted({"id", *requested}))
+
+# Upper bound on vehicle types x durations x payment methods per batch quote
+MAX_BATCH_QUOTES = 1000
+
+# Idle job streams send a comment frame this often to keep proxies from closing them
+JOB_STREAM_HEARTBEAT_SECONDS = 15
+
 # Startup event
 @app.on_event("startup")
 async def startup_db():
@@ -36,10 +100,20 @@ async def startup_db():
     if vehicle_count == 0:
         print("Database appears empty, seeding with initial data...")
         await seed_data.seed_database()
+        content_cache.invalidate()
+    
+    await pricing_engine.load()
+    pricing_engine.start()
+    await location_index.load()
+    await vehicle_availability.load()
+    await trip_tracker.load()
+    location_store.start()
 
 # Shutdown event  
 @app.on_event("shutdown")
 async def shutdown_db():
+    await pricing_engine.stop()
+    await location_store.stop()
     await db.close()
 
 # ==================== AUTH ENDPOINTS ====================
@@ -96,132 +170,116 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 # ==================== VEHICLE ENDPOINTS ====================
 
 @api_router.get("/vehicles", response_model=APIResponse)
-async def get_vehicles(category: Optional[str] = None):
-    try:
+async def get_vehicles(request: Request, category: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, Vehicle)
+    
+    async def load_vehicles():
         if category:
-            vehicles = await db.get_vehicles_by_category(category)
-        else:
-            vehicles = await db.find_documents("vehicles", {"available": True})
-        
-        return APIResponse(
-            success=True,
-            message="Vehicles retrieved successfully",
-            data=vehicles
-        )
+            return await db.get_vehicles_by_category(category, fields=projection)
+        return await db.get_available_vehicles(fields=projection)
+    
+    try:
+        cache_key = (category, projection)
+        entry = await content_cache.get("vehicles", cache_key, load_vehicles,
+                                        "Vehicles retrieved successfully")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return cached_response(request, entry)
+
+@api_router.get("/vehicles/availability", response_model=APIResponse)
+async def get_vehicle_availability(start: datetime, end: datetime, category: Optional[str] = None,
+                                   vehicle_type: Optional[str] = None):
+    """Vehicles with no active booking overlapping [start, end)"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    vehicles = vehicle_availability.free_vehicles(start.replace(tzinfo=None), end.replace(tzinfo=None),
+                                                  category=category, vehicle_type=vehicle_type)
+    return envelope("Available vehicles retrieved successfully", vehicles)
 
 @api_router.get("/vehicles/{vehicle_id}", response_model=APIResponse)
-async def get_vehicle(vehicle_id: str):
-    vehicle = await db.get_document("vehicles", vehicle_id)
+async def get_vehicle(vehicle_id: str, fields: Optional[str] = None):
+    vehicle = await db.get_document("vehicles", vehicle_id, fields=parse_fields(fields, Vehicle))
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    return APIResponse(
-        success=True,
-        message="Vehicle retrieved successfully",
-        data=vehicle
-    )
+    return envelope("Vehicle retrieved successfully", vehicle)
 
 # ==================== LOCATION ENDPOINTS ====================
 
 @api_router.get("/locations", response_model=APIResponse)
-async def get_locations():
-    locations = await db.find_documents("locations")
-    return APIResponse(
-        success=True,
-        message="Locations retrieved successfully",
-        data=locations
-    )
+async def get_locations(request: Request, fields: Optional[str] = None):
+    projection = parse_fields(fields, Location)
+    entry = await content_cache.get("locations", projection,
+                                    lambda: db.find_documents("locations", fields=projection),
+                                    "Locations retrieved successfully")
+    return cached_response(request, entry)
 
 @api_router.get("/locations/search", response_model=APIResponse)
-async def search_locations(query: str):
-    # Simple text search - in production, use MongoDB text index
-    locations = await db.find_documents("locations")
-    filtered = [loc for loc in locations if query.lower() in loc['name'].lower()]
-    
-    return APIResponse(
-        success=True,
-        message="Locations found",
-        data=filtered
-    )
+async def search_locations(query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+    # Served from the in-memory autocomplete index; no database round trip
+    return envelope("Locations found", location_index.search(query, limit))
 
 # ==================== PRICING ENDPOINTS ====================
 
 @api_router.post("/pricing/calculate", response_model=APIResponse)
 async def calculate_price(request: PriceEstimateRequest):
     try:
-        # Get pricing rules
-        pricing_rules = await db.find_documents("pricing_rules", {"vehicle_type": request.vehicle_type})
-        if not pricing_rules:
+        if not pricing_engine.has_vehicle_type(request.vehicle_type):
             raise HTTPException(status_code=404, detail="Pricing not found for vehicle type")
         
-        rule = pricing_rules[0]
-        
-        # Calculate base price
-        if request.service_type == "rental" and request.duration_days:
-            base_price = rule["base_price_daily"] * request.duration_days
-        else:
-            hours = request.duration_hours or 1
-            base_price = rule["base_price_hourly"] * hours
-        
-        # Calculate extras price
-        extras_price = 0
-        if request.extras:
-            extras_data = await db.find_documents("extras")
-            extras_map = {extra["name"]: extra["price"] for extra in extras_data}
-            extras_price = sum(extras_map.get(extra, 0) for extra in request.extras)
-        
-        subtotal = base_price + extras_price
-        
-        # Apply payment method discount
-        payment_discounts = {
-            "icp": 0.15,
-            "usdt": 0.10,
-            "btc": 0.10,
-            "eth": 0.10,
-            "card": 0.0
-        }
-        payment_discount = payment_discounts.get(request.payment_method, 0.0)
-        payment_discount_amount = subtotal * payment_discount
-        
-        # Apply promo code discount
-        promo_discount_amount = 0
+        promo = None
         if request.promo_code:
             promo = await db.validate_promo_code(request.promo_code)
-            if promo:
-                promo_discount_amount = subtotal * promo["discount_percentage"]
-        
-        total_discount = payment_discount_amount + promo_discount_amount
-        total_price = max(0, subtotal - total_discount)
-        
-        breakdown = {
-            "base_price": base_price,
-            "extras_price": extras_price,
-            "subtotal": subtotal,
-            "payment_discount": payment_discount_amount,
-            "promo_discount": promo_discount_amount,
-            "total_discount": total_discount,
-            "total_price": total_price
-        }
         
-        estimate = PriceEstimate(
-            base_price=base_price,
-            extras_price=extras_price,
-            discount_amount=total_discount,
-            total_price=total_price,
-            breakdown=breakdown
+        estimate = pricing_engine.quote(
+            request.vehicle_type,
+            request.service_type,
+            duration_hours=request.duration_hours,
+            duration_days=request.duration_days,
+            extras=request.extras,
+            payment_method=request.payment_method,
+            promo=promo
         )
         
-        return APIResponse(
-            success=True,
-            message="Price calculated successfully",
-            data=estimate.dict()
-        )
+        return envelope("Price calculated successfully", estimate.dict())
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/pricing/batch", response_model=APIResponse)
+async def calculate_price_matrix(request: BatchPriceEstimateRequest):
+    if not request.vehicle_types or not request.durations or not request.payment_methods:
+        raise HTTPException(status_code=400, detail="Vehicle types, durations and payment methods are required")
+    if len(request.vehicle_types) * len(request.durations) * len(request.payment_methods) > MAX_BATCH_QUOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUOTES} quotes per request")
+    
+    unknown = [v for v in request.vehicle_types if not pricing_engine.has_vehicle_type(v)]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Pricing not found for vehicle types: {', '.join(unknown)}")
+    
+    promo = None
+    if request.promo_code:
+        promo = await db.validate_promo_code(request.promo_code)
+    
+    quotes = pricing_engine.quote_matrix(
+        request.vehicle_types,
+        request.service_type,
+        request.durations,
+        extras=request.extras,
+        payment_methods=request.payment_methods,
+        promo=promo
+    )
+    
+    return envelope("Prices calculated successfully", {
+        "vehicle_types": request.vehicle_types,
+        "durations": request.durations,
+        "payment_methods": request.payment_methods,
+        "quotes": quotes
+    })
+
 @api_router.post("/promo/validate", response_model=APIResponse)
 async def validate_promo(validation: PromoValidation):
     promo = await db.validate_promo_code(validation.code)
@@ -255,64 +313,103 @@ async def create_booking(booking_create: BookingCreate, current_user: User = Dep
             promo_code=booking_create.promo_code
         )
         
-        # Reuse the calculate_price logic
-        pricing_rules = await db.find_documents("pricing_rules", {"vehicle_type": booking_create.vehicle_type})
-        if not pricing_rules:
+        if not pricing_engine.has_vehicle_type(booking_create.vehicle_type):
             raise HTTPException(status_code=404, detail="Pricing not found for vehicle type")
         
-        rule = pricing_rules[0]
-        base_price = rule["base_price_hourly"]  # Simplified for demo
-        
-        # Calculate extras
-        extras_price = 0
-        if booking_create.extras:
-            extras_data = await db.find_documents("extras")
-            extras_map = {extra["name"]: extra["price"] for extra in extras_data}
-            extras_price = sum(extras_map.get(extra, 0) for extra in booking_create.extras)
-        
-        subtotal = base_price + extras_price
-        
-        # Apply discounts (simplified)
-        discount_amount = 0
+        promo = None
         if booking_create.promo_code:
             promo = await db.validate_promo_code(booking_create.promo_code)
-            if promo:
-                discount_amount = subtotal * promo["discount_percentage"]
-                await db.increment_promo_usage(promo["id"])
         
-        total_price = max(0, subtotal - discount_amount)
+        # Same engine as /pricing/calculate so the booked price matches the quote
+        estimate = pricing_engine.quote(
+            price_request.vehicle_type,
+            price_request.service_type,
+            duration_hours=price_request.duration_hours,
+            duration_days=price_request.duration_days,
+            extras=price_request.extras,
+            payment_method=price_request.payment_method,
+            promo=promo
+        )
+        
+        start, end = booking_window(booking_create.dict())
+        if booking_create.return_date and end <= start:
+            raise HTTPException(status_code=400, detail="Return must be after pickup")
+        
+        # Check and reserve the vehicle with no await in between, so concurrent
+        # requests cannot both take the same slot
+        vehicle_id = booking_create.vehicle_id
+        if vehicle_id:
+            vehicle = vehicle_availability.get_vehicle(vehicle_id)
+            if not vehicle:
+                raise HTTPException(status_code=404, detail="Vehicle not found")
+            if vehicle.get("type") != booking_create.vehicle_type:
+                raise HTTPException(status_code=400, detail="Vehicle does not match vehicle_type")
+            if not vehicle_availability.is_free(vehicle_id, start, end):
+                raise HTTPException(status_code=409, detail="Vehicle is already booked for the requested time")
+        elif vehicle_availability.fleet_size(booking_create.vehicle_type):
+            free = vehicle_availability.free_vehicles(start, end, vehicle_type=booking_create.vehicle_type)
+            if not free:
+                raise HTTPException(status_code=409,
+                                    detail=f"No {booking_create.vehicle_type} vehicles are available for the requested time")
+            vehicle_id = free[0]["id"]
         
         # Create booking
         booking_data = booking_create.dict()
         booking_data.update({
             "user_id": current_user.id,
-            "base_price": base_price,
-            "extras_price": extras_price,
-            "discount_amount": discount_amount,
-            "total_price": total_price,
-            "status": BookingStatus.PENDING
+            "vehicle_id": vehicle_id,
+            "base_price": estimate.base_price,
+            "extras_price": estimate.extras_price,
+            "discount_amount": estimate.discount_amount,
+            "total_price": estimate.total_price,
+            # Chauffeur rides need a driver, so they go straight to the offer pool
+            "status": BookingStatus.REQUESTED if price_request.service_type == "chauffeur"
+            else BookingStatus.PENDING
         })
         
         booking = Booking(**booking_data)
-        booking_id = await db.create_document("bookings", booking.dict())
+        if vehicle_id:
+            vehicle_availability.reserve(vehicle_id, booking.id, start, end)
+        try:
+            await db.create_document("bookings", booking.dict())
+        except Exception:
+            vehicle_availability.release(booking.id)
+            raise
         
-        return APIResponse(
-            success=True,
-            message="Booking created successfully",
-            data=booking.dict()
-        )
+        # Only a booking that was actually made uses up a promo redemption
+        if promo:
+            await db.increment_promo_usage(promo["id"])
+        
+        if booking.status == BookingStatus.REQUESTED:
+            job_hub.publish_offer(booking.dict())
+        
+        return envelope("Booking created successfully", booking.dict())
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/bookings", response_model=APIResponse)
-async def get_user_bookings(current_user: User = Depends(get_current_user)):
-    bookings = await db.get_user_bookings(current_user.id)
-    return APIResponse(
-        success=True,
-        message="Bookings retrieved successfully",
-        data=bookings
-    )
+async def get_user_bookings(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                            fields: Optional[str] = None,
+                            current_user: User = Depends(get_current_user)):
+    projection = parse_fields(fields, Booking)
+    try:
+        page = await db.get_user_bookings(current_user.id, limit=limit, cursor=cursor,
+                                          fields=projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return envelope("Bookings retrieved successfully", page)
+
+@api_router.get("/bookings/export")
+async def export_user_bookings(batch_size: int = STREAM_BATCH_SIZE,
+                               current_user: User = Depends(get_current_user)):
+    batch_size = max(1, min(batch_size, MAX_STREAM_BATCH_SIZE))
+    bookings = db.stream_documents("bookings", {"user_id": current_user.id},
+                                   sort=[("created_at", -1)], batch_size=batch_size)
+    return ndjson_response(bookings, batch_size)
 
 @api_router.get("/bookings/{booking_id}", response_model=APIResponse)
 async def get_booking(booking_id: str, current_user: User = Depends(get_current_user)):
@@ -324,52 +421,84 @@ async def get_booking(booking_id: str, current_user: User = Depends(get_current_
     if booking["user_id"] != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this booking")
     
-    return APIResponse(
-        success=True,
-        message="Booking retrieved successfully",
-        data=booking
-    )
+    return envelope("Booking retrieved successfully", booking)
+
+# ==================== REWARDS ENDPOINTS ====================
+
+@api_router.get("/rewards/history", response_model=APIResponse)
+async def get_reward_history(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                             fields: Optional[str] = None,
+                             current_user: User = Depends(get_current_user)):
+    projection = parse_fields(fields, RewardTransaction)
+    try:
+        page = await db.get_user_reward_history(current_user.id, limit=limit, cursor=cursor,
+                                                fields=projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return envelope("Reward history retrieved successfully", page)
+
+@api_router.get("/rewards/balance", response_model=APIResponse)
+async def get_reward_balance(current_user: User = Depends(get_current_user)):
+    rewards = await db.get_user_rewards(current_user.id)
+    return envelope("Reward balance retrieved successfully", rewards)
+
+@api_router.get("/rewards/history/export")
+async def export_reward_history(batch_size: int = STREAM_BATCH_SIZE,
+                                current_user: User = Depends(get_current_user)):
+    batch_size = max(1, min(batch_size, MAX_STREAM_BATCH_SIZE))
+    transactions = db.stream_documents("reward_transactions", {"user_id": current_user.id},
+                                       sort=[("created_at", -1)], batch_size=batch_size)
+    return ndjson_response(transactions, batch_size)
 
 # ==================== CONTENT ENDPOINTS ====================
 
 @api_router.get("/services", response_model=APIResponse)
-async def get_services():
-    services = await db.get_services()
-    return APIResponse(
-        success=True,
-        message="Services retrieved successfully",
-        data=services
-    )
+async def get_services(request: Request, fields: Optional[str] = None):
+    projection = parse_fields(fields, Service)
+    entry = await content_cache.get("services", projection,
+                                    lambda: db.get_services(fields=projection),
+                                    "Services retrieved successfully")
+    return cached_response(request, entry)
 
 @api_router.get("/testimonials", response_model=APIResponse)
-async def get_testimonials():
-    testimonials = await db.get_testimonials()
-    return APIResponse(
-        success=True,
-        message="Testimonials retrieved successfully",
-        data=testimonials
-    )
+async def get_testimonials(request: Request, fields: Optional[str] = None):
+    projection = parse_fields(fields, Testimonial)
+    entry = await content_cache.get("testimonials", projection,
+                                    lambda: db.get_testimonials(fields=projection),
+                                    "Testimonials retrieved successfully")
+    return cached_response(request, entry)
 
 @api_router.get("/blog/posts", response_model=APIResponse)
-async def get_blog_posts(limit: int = 10):
-    posts = await db.get_blog_posts(limit=limit)
-    return APIResponse(
-        success=True,
-        message="Blog posts retrieved successfully",
-        data=posts
-    )
+async def get_blog_posts(request: Request, limit: int = 10, fields: Optional[str] = None):
+    limit = max(1, min(limit, 100))
+    projection = parse_fields(fields, BlogPost)
+    entry = await content_cache.get("blog_posts", (limit, projection),
+                                    lambda: db.get_blog_posts(limit=limit, fields=projection),
+                                    "Blog posts retrieved successfully")
+    return cached_response(request, entry)
 
 @api_router.get("/faqs", response_model=APIResponse)
-async def get_faqs(category: Optional[str] = None):
-    faqs = await db.get_faqs(category)
-    return APIResponse(
-        success=True,
-        message="FAQs retrieved successfully",
-        data=faqs
-    )
+async def get_faqs(request: Request, category: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, FAQ)
+    entry = await content_cache.get("faqs", (category, projection),
+                                    lambda: db.get_faqs(category, fields=projection),
+                                    "FAQs retrieved successfully")
+    return cached_response(request, entry)
 
 # ==================== DRIVER ENDPOINTS ====================
 
+async def resolve_driver_id(user: User) -> str:
+    """Driver id for a user, looked up once and then served from memory"""
+    driver_id = location_store.driver_id_for(user.id)
+    if not driver_id:
+        driver = await db.get_driver_by_user_id(user.id)
+        if not driver:
+            raise HTTPException(status_code=404, detail="Driver profile not found")
+        driver_id = driver["id"]
+        location_store.remember_driver(user.id, driver_id)
+    return driver_id
+
 @api_router.post("/drivers/register", response_model=APIResponse)
 async def register_driver(driver_create: DriverCreate, current_user: User = Depends(get_current_user)):
     try:
@@ -398,11 +527,12 @@ async def get_driver_profile(current_user: User = Depends(get_current_user)):
     if not driver:
         raise HTTPException(status_code=404, detail="Driver profile not found")
     
-    return APIResponse(
-        success=True,
-        message="Driver profile retrieved successfully",
-        data=driver
-    )
+    # Latest position may not have been flushed yet
+    position = location_store.get(driver["id"])
+    if position:
+        driver.update(position)
+    
+    return envelope("Driver profile retrieved successfully", driver)
 
 @api_router.put("/drivers/status", response_model=APIResponse)
 async def update_driver_status(status_update: dict, current_user: User = Depends(get_current_user)):
@@ -410,7 +540,7 @@ async def update_driver_status(status_update: dict, current_user: User = Depends
     if not driver:
         raise HTTPException(status_code=404, detail="Driver profile not found")
     
-    updated = await db.update_document("drivers", driver["id"], status_update)
+    updated = await db.update_driver(driver["id"], status_update)
     if not updated:
         raise HTTPException(status_code=500, detail="Failed to update driver status")
     
@@ -421,19 +551,51 @@ async def update_driver_status(status_update: dict, current_user: User = Depends
 
 @api_router.put("/drivers/location", response_model=APIResponse)
 async def update_driver_location(location_data: dict, current_user: User = Depends(get_current_user)):
-    driver = await db.get_driver_by_user_id(current_user.id)
-    if not driver:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
+    try:
+        lat = float(location_data["current_lat"])
+        lng = float(location_data["current_lng"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="current_lat and current_lng are required")
     
-    updated = await db.update_document("drivers", driver["id"], location_data)
-    if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update driver location")
+    # Positions are buffered in memory and flushed to Mongo in batches
+    driver_id = await resolve_driver_id(current_user)
+    _, _, recorded_at = location_store.update(driver_id, lat, lng)
+    trip_tracker.record(driver_id, lat, lng, recorded_at)
     
     return APIResponse(
         success=True,
         message="Driver location updated successfully"
     )
 
+@api_router.post("/drivers/location/batch", response_model=APIResponse)
+async def upload_driver_locations(batch: GPSFixBatch, current_user: User = Depends(get_current_user)):
+    """Ingest fixes buffered on the device while it was offline, oldest first"""
+    if len(batch.fixes) > MAX_FIXES_PER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FIXES_PER_BATCH} fixes per batch")
+    
+    driver_id = await resolve_driver_id(current_user)
+    points, dropped = await track_store.ingest(driver_id, batch.fixes)
+    if points:
+        for point in points:
+            trip_tracker.record(driver_id, point["lat"], point["lng"], point["recorded_at"])
+        latest = points[-1]
+        current = location_store.last_recorded_at(driver_id)
+        if current is None or latest["recorded_at"] > current:
+            location_store.update(driver_id, latest["lat"], latest["lng"], latest["recorded_at"])
+    
+    return envelope("Driver locations recorded successfully", {"accepted": len(points), **dropped})
+
+@api_router.get("/drivers/nearby", response_model=APIResponse)
+async def get_nearby_drivers(lat: float, lng: float, radius: float = 5000, limit: int = 10,
+                             current_user: User = Depends(get_current_user)):
+    if radius <= 0 or limit <= 0:
+        raise HTTPException(status_code=400, detail="Radius and limit must be positive")
+    
+    drivers = await db.get_available_drivers({"lat": lat, "lng": lng},
+                                             max_distance=radius, limit=min(limit, 100))
+    
+    return envelope("Nearby drivers retrieved successfully", drivers)
+
 @api_router.get("/drivers/available-jobs", response_model=APIResponse)
 async def get_available_jobs(current_user: User = Depends(get_current_user)):
     # Get pending bookings without assigned drivers
@@ -442,10 +604,43 @@ async def get_available_jobs(current_user: User = Depends(get_current_user)):
         "driver_id": None
     }, limit=10)
     
-    return APIResponse(
-        success=True,
-        message="Available jobs retrieved successfully",
-        data=jobs
+    return envelope("Available jobs retrieved successfully", jobs)
+
+@api_router.get("/drivers/job-stream")
+async def stream_jobs(request: Request, current_user: User = Depends(get_current_user)):
+    driver = await db.get_driver_by_user_id(current_user.id)
+    if not driver:
+        raise HTTPException(status_code=404, detail="Driver profile not found")
+    
+    driver_id = driver["id"]
+    queue = job_hub.subscribe(driver_id)
+    
+    # Offers published before the driver connected
+    backlog = await db.find_documents("bookings", {
+        "status": "requested",
+        "driver_id": None
+    }, limit=10)
+    
+    async def event_stream():
+        try:
+            for job in backlog:
+                if job_hub.is_relevant(driver_id, job):
+                    yield format_sse({"event": "job_offer", "data": job})
+            
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=JOB_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            job_hub.unsubscribe(driver_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @api_router.post("/drivers/accept-job", response_model=APIResponse)
@@ -454,29 +649,17 @@ async def accept_job(job_data: dict, current_user: User = Depends(get_current_us
     if not booking_id:
         raise HTTPException(status_code=400, detail="Booking ID required")
     
-    driver = await db.get_driver_by_user_id(current_user.id)
-    if not driver:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-    
-    # Update booking with driver assignment
-    booking_update = {
-        "driver_id": driver["id"],
-        "status": "driver_assigned",
-        "started_at": datetime.utcnow().isoformat()
-    }
+    driver_id = await resolve_driver_id(current_user)
     
-    updated = await db.update_document("bookings", booking_id, booking_update)
-    if not updated:
-        raise HTTPException(status_code=500, detail="Failed to accept job")
+    # Conditional claim: only one driver can move a requested booking forward
+    booking = await db.claim_booking(booking_id, driver_id)
+    if not booking:
+        raise HTTPException(status_code=409, detail="Job is no longer available")
     
-    # Get the updated booking
-    booking = await db.get_document("bookings", booking_id)
+    job_hub.publish_taken(booking_id, driver_id)
+    trip_tracker.start(driver_id, booking_id)
     
-    return APIResponse(
-        success=True,
-        message="Job accepted successfully",
-        data=booking
-    )
+    return envelope("Job accepted successfully", booking)
 
 @api_router.put("/bookings/{booking_id}/status", response_model=APIResponse)
 async def update_booking_status(booking_id: str, status_update: dict, current_user: User = Depends(get_current_user)):
@@ -491,26 +674,61 @@ async def update_booking_status(booking_id: str, status_update: dict, current_us
     
     # Add completion logic
     if status_update.get("status") == "completed":
-        status_update["completed_at"] = datetime.utcnow().isoformat()
-        if not status_update.get("actual_cost"):
-            status_update["actual_cost"] = booking.get("total_price", booking.get("estimated_cost", 0))
+        status_update["completed_at"] = datetime.utcnow()
+        actual_cost = status_update.get("actual_cost")
+        if actual_cost in (None, ""):
+            actual_cost = booking.get("total_price", booking.get("estimated_cost", 0))
+        try:
+            actual_cost = math.nan if isinstance(actual_cost, bool) else float(actual_cost)
+        except (TypeError, ValueError):
+            actual_cost = math.nan
+        if not math.isfinite(actual_cost) or actual_cost < 0:
+            raise HTTPException(status_code=400, detail="actual_cost must be a non-negative number")
+        status_update["actual_cost"] = actual_cost
         
-        # Update driver earnings
-        earnings_update = {
-            "total_earnings": driver.get("total_earnings", 0) + status_update["actual_cost"],
-            "total_rides": driver.get("total_rides", 0) + 1
-        }
-        await db.update_document("drivers", driver["id"], earnings_update)
+        # Store the driven route, simplified, with the completion itself
+        status_update.update(trip_tracker.finish(booking_id))
+        
+        # Completing and crediting are separate steps so a retry can finish a
+        # credit that failed; each booking is still credited at most once
+        completed = await db.complete_booking(booking_id, status_update)
+        if not await db.credit_driver_earnings(booking_id) and not completed:
+            raise HTTPException(status_code=409, detail="Booking is already completed")
+    elif status_update.get("status") == "requested":
+        # Handing the job back: unassign it so other drivers can claim the offer
+        offer = await db.release_booking(booking_id, driver["id"])
+        if not offer:
+            raise HTTPException(status_code=409, detail="Booking is no longer assigned to this driver")
+        trip_tracker.discard(booking_id)
+        job_hub.publish_offer(offer)
+    else:
+        updated = await db.update_document("bookings", booking_id, status_update)
+        if not updated:
+            raise HTTPException(status_code=500, detail="Failed to update booking status")
     
-    updated = await db.update_document("bookings", booking_id, status_update)
-    if not updated:
-        raise HTTPException(status_code=500, detail="Failed to update booking status")
+    if status_update.get("status") == "cancelled":
+        trip_tracker.discard(booking_id)
     
     return APIResponse(
         success=True,
         message="Booking status updated successfully"
     )
 
+@api_router.get("/drivers/earnings", response_model=APIResponse)
+async def get_driver_earnings(current_user: User = Depends(get_current_user)):
+    driver_id = await resolve_driver_id(current_user)
+    summary = await db.get_driver_earnings_summary(driver_id)
+    return envelope("Earnings summary retrieved successfully", summary)
+
+@api_router.get("/drivers/jobs/export")
+async def export_driver_jobs(batch_size: int = STREAM_BATCH_SIZE,
+                             current_user: User = Depends(get_current_user)):
+    batch_size = max(1, min(batch_size, MAX_STREAM_BATCH_SIZE))
+    driver_id = await resolve_driver_id(current_user)
+    jobs = db.stream_documents("bookings", {"driver_id": driver_id},
+                               sort=[("created_at", -1)], batch_size=batch_size)
+    return ndjson_response(jobs, batch_size)
+
 @api_router.get("/drivers/current-job", response_model=APIResponse)
 async def get_current_job(current_user: User = Depends(get_current_user)):
     driver = await db.get_driver_by_user_id(current_user.id)
@@ -525,11 +743,7 @@ async def get_current_job(current_user: User = Depends(get_current_user)):
     
     current_job = current_jobs[0] if current_jobs else None
     
-    return APIResponse(
-        success=True,
-        message="Current job retrieved successfully",
-        data=current_job
-    )
+    return envelope("Current job retrieved successfully", current_job)
 
 # ==================== ROOT ENDPOINT ====================
 
@@ -545,6 +759,46 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+# Prometheus scrape endpoint
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ==================== ADMIN ENDPOINTS ====================
+
+@api_router.get("/admin/slow-queries", response_model=APIResponse, dependencies=[Depends(require_admin)])
+async def get_slow_queries(limit: int = 50):
+    """Most recent commands over SLOW_QUERY_MS, newest first, with sampled explain plans"""
+    entries = slow_query_monitor.entries(max(1, limit))
+    return envelope("Slow queries retrieved successfully", {
+        "threshold_ms": slow_query_monitor.threshold_ms,
+        "items": entries
+    })
+
+@api_router.delete("/admin/slow-queries", response_model=APIResponse, dependencies=[Depends(require_admin)])
+async def clear_slow_queries():
+    slow_query_monitor.clear()
+    return envelope("Slow queries cleared")
+
+@api_router.post("/admin/reward-transactions", response_model=APIResponse,
+                 dependencies=[Depends(require_admin)])
+async def create_reward_transaction(transaction_create: RewardTransactionCreate):
+    if not await db.get_user_by_id(transaction_create.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    transaction = RewardTransaction(**transaction_create.dict())
+    await db.create_reward_transaction(transaction.dict())
+    return envelope("Reward transaction created successfully", transaction.dict())
+
+@api_router.post("/admin/rewards/reconcile", response_model=APIResponse,
+                 dependencies=[Depends(require_admin)])
+async def reconcile_rewards():
+    modified = await db.reconcile_reward_balances()
+    return envelope("Reward balances reconciled", {"profiles_updated": modified})
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -557,6 +811,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and status metrics, outermost so it times the whole stack
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
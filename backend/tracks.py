@@ -0,0 +1,282 @@
+import math
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+
+from database import db, ASSIGNED_STATUSES
+from job_hub import haversine_meters
+from models import GPSFix
+
+# Largest number of fixes accepted in one batch upload
+MAX_FIXES_PER_BATCH = 1000
+
+# Fixes stamped further than this in the future are treated as bad device clocks
+MAX_CLOCK_SKEW = timedelta(minutes=2)
+
+# Most recent fixes kept per active trip; older ones are overwritten
+TRIP_TRACK_CAPACITY = int(os.environ.get("TRIP_TRACK_CAPACITY", "7200"))
+
+# Douglas-Peucker tolerance used when a trip's route is stored
+ROUTE_SIMPLIFY_TOLERANCE_METERS = float(os.environ.get("ROUTE_SIMPLIFY_TOLERANCE_METERS", "10"))
+
+def to_utc(moment: datetime) -> datetime:
+    """Naive UTC datetime, matching how the rest of the app stores timestamps"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def bucket_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def clean_fixes(fixes: List[GPSFix], after: Optional[datetime] = None,
+                now: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Validate a batch of fixes in one pass.
+
+    Keeps fixes in strictly increasing time order after `after`, the last
+    time already recorded for the driver. Returns the accepted fixes as
+    plain dicts plus counts of what was dropped and why.
+    """
+    latest_allowed = (now or datetime.utcnow()) + MAX_CLOCK_SKEW
+    accepted: List[Dict[str, Any]] = []
+    counts = {"invalid": 0, "duplicates": 0, "out_of_order": 0}
+    for fix in fixes:
+        recorded_at = to_utc(fix.recorded_at)
+        # BSON dates keep milliseconds; truncate so stored marks compare equal
+        recorded_at = recorded_at.replace(microsecond=recorded_at.microsecond // 1000 * 1000)
+        if (not -90 <= fix.lat <= 90 or not -180 <= fix.lng <= 180
+                or not math.isfinite(fix.lat) or not math.isfinite(fix.lng)
+                or recorded_at > latest_allowed):
+            counts["invalid"] += 1
+            continue
+        if after is not None and recorded_at <= after:
+            counts["duplicates" if recorded_at == after else "out_of_order"] += 1
+            continue
+        point = {"lat": fix.lat, "lng": fix.lng, "recorded_at": recorded_at}
+        for field in ("accuracy", "speed", "heading"):
+            value = getattr(fix, field)
+            if value is not None:
+                point[field] = value
+        accepted.append(point)
+        after = recorded_at
+    return accepted, counts
+
+class TrackStore:
+    """Raw GPS history per driver, stored as one document per driver and hour.
+
+    A batch of fixes becomes one $push per hour it spans, all sent in a
+    single unordered bulk_write, instead of a document per fix. Buckets
+    expire after TRACK_RETENTION_DAYS through a TTL index.
+
+    The newest stored fix per driver is remembered so retried uploads are
+    recognised as duplicates. On first use for a driver it is seeded from
+    the newest bucket, so restarts and other workers do not forget it. That
+    mark is separate from the live position in location_store: a
+    reconnecting phone usually pings its current position before uploading
+    the older backlog.
+    """
+
+    def __init__(self):
+        self._high_water: Dict[str, Optional[datetime]] = {}
+
+    async def last_recorded_at(self, driver_id: str) -> Optional[datetime]:
+        if driver_id not in self._high_water:
+            newest = await db.db.driver_tracks.find_one(
+                {"driver_id": driver_id}, {"_id": 0, "last_recorded_at": 1},
+                sort=[("bucket_start", DESCENDING)])
+            # A concurrent upload may have moved the mark while this was loading
+            self._high_water.setdefault(driver_id, newest and newest.get("last_recorded_at"))
+        return self._high_water[driver_id]
+
+    async def ingest(self, driver_id: str, fixes: List[GPSFix]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Clean a batch against the driver's mark and persist what is new.
+
+        The mark is checked and advanced with no await in between, so two
+        concurrent uploads of the same backlog cannot both be accepted.
+        """
+        previous = await self.last_recorded_at(driver_id)
+        points, dropped = clean_fixes(fixes, after=previous)
+        if not points:
+            return points, dropped
+        latest = points[-1]["recorded_at"]
+        self._high_water[driver_id] = latest
+        try:
+            await self.append(driver_id, points)
+        except Exception:
+            # Let a retry through, unless a later upload has moved the mark on
+            if self._high_water.get(driver_id) == latest:
+                self._high_water[driver_id] = previous
+            raise
+        return points, dropped
+
+    async def append(self, driver_id: str, points: List[Dict[str, Any]]) -> int:
+        """Persist accepted points (oldest first) and return how many buckets were touched"""
+        buckets: Dict[datetime, List[Dict[str, Any]]] = {}
+        for point in points:
+            buckets.setdefault(bucket_start(point["recorded_at"]), []).append(point)
+        if not buckets:
+            return 0
+        await db.db.driver_tracks.bulk_write([
+            UpdateOne(
+                {"driver_id": driver_id, "bucket_start": start},
+                {
+                    "$push": {"points": {"$each": bucket_points}},
+                    "$inc": {"count": len(bucket_points)},
+                    "$max": {"last_recorded_at": bucket_points[-1]["recorded_at"]}
+                },
+                upsert=True
+            )
+            for start, bucket_points in buckets.items()
+        ], ordered=False)
+        return len(buckets)
+
+class TripTrack:
+    """Fixed-capacity ring buffer of (lat, lng, timestamp) for one trip.
+
+    Columns are array('d') so a fix costs 24 bytes rather than a dict and
+    three floats. The arrays grow until capacity and are then overwritten
+    oldest first.
+    """
+
+    __slots__ = ("capacity", "lats", "lngs", "times", "_next")
+
+    def __init__(self, capacity: int = TRIP_TRACK_CAPACITY):
+        self.capacity = capacity
+        self.lats = array("d")
+        self.lngs = array("d")
+        self.times = array("d")
+        self._next = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, lat: float, lng: float, recorded_at: datetime):
+        timestamp = recorded_at.replace(tzinfo=timezone.utc).timestamp()
+        if len(self.times) < self.capacity:
+            self.lats.append(lat)
+            self.lngs.append(lng)
+            self.times.append(timestamp)
+            return
+        self.lats[self._next] = lat
+        self.lngs[self._next] = lng
+        self.times[self._next] = timestamp
+        self._next = (self._next + 1) % self.capacity
+
+    def points(self) -> List[Tuple[float, float]]:
+        """(lat, lng) in time order; batch uploads can arrive after live pings"""
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        return [(self.lats[i], self.lngs[i]) for i in order]
+
+def simplify(points: List[Tuple[float, float]], tolerance_meters: float) -> List[Tuple[float, float]]:
+    """Douglas-Peucker line simplification with a tolerance in meters.
+
+    Points are projected onto a local equirectangular plane around the first
+    point, which is accurate to well under a meter over a city-sized trip.
+    Iterative, so long tracks cannot hit the recursion limit.
+    """
+    if len(points) < 3:
+        return list(points)
+    origin_lat = math.radians(points[0][0])
+    scale_y = 6371000 * math.pi / 180
+    scale_x = scale_y * math.cos(origin_lat)
+    xy = [(lng * scale_x, lat * scale_y) for lat, lng in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        farthest, max_distance = None, tolerance_meters
+        for i in range(first + 1, last):
+            x0, y0 = xy[i]
+            if length == 0:
+                distance = math.hypot(x0 - x1, y0 - y1)
+            else:
+                distance = abs(dy * x0 - dx * y0 + x2 * y1 - y2 * x1) / length
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def encode_polyline(points: List[Tuple[float, float]], precision: int = 5) -> str:
+    """Encode (lat, lng) pairs in the Google encoded polyline format"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lng = 0
+    for lat, lng in points:
+        lat_e5, lng_e5 = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (lat_e5 - previous_lat, lng_e5 - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        previous_lat, previous_lng = lat_e5, lng_e5
+    return "".join(encoded)
+
+class TripTracker:
+    """Captures the route of each active booking from its driver's fixes.
+
+    A TripTrack is opened when a driver claims a booking and fed by both the
+    live location endpoint and batch uploads. On completion the track is
+    simplified and returned as booking fields, so a trip costs one extra
+    field on the booking instead of a document per fix.
+    """
+
+    def __init__(self, tolerance_meters: float = ROUTE_SIMPLIFY_TOLERANCE_METERS):
+        self.tolerance_meters = tolerance_meters
+        self._tracks: Dict[str, TripTrack] = {}
+        self._driver_trips: Dict[str, str] = {}
+
+    async def load(self):
+        """Reopen (empty) tracks for trips that were active before a restart"""
+        bookings = await db.find_documents("bookings", {
+            "status": {"$in": ASSIGNED_STATUSES},
+            "driver_id": {"$ne": None}
+        }, limit=0, fields=["id", "driver_id"])
+        for booking in bookings:
+            self.start(booking["driver_id"], booking["id"])
+
+    def start(self, driver_id: str, booking_id: str):
+        self._driver_trips[driver_id] = booking_id
+        self._tracks.setdefault(booking_id, TripTrack())
+
+    def record(self, driver_id: str, lat: float, lng: float, recorded_at: datetime):
+        booking_id = self._driver_trips.get(driver_id)
+        if booking_id is not None:
+            self._tracks[booking_id].append(lat, lng, recorded_at)
+
+    def discard(self, booking_id: str):
+        self._tracks.pop(booking_id, None)
+        for driver_id, trip in list(self._driver_trips.items()):
+            if trip == booking_id:
+                del self._driver_trips[driver_id]
+
+    def finish(self, booking_id: str) -> Dict[str, Any]:
+        """Close a trip and return its route fields for the booking (empty if untracked)"""
+        track = self._tracks.get(booking_id)
+        self.discard(booking_id)
+        if not track:
+            return {}
+        points = track.points()
+        route = simplify(points, self.tolerance_meters)
+        return {
+            "route_polyline": encode_polyline(route),
+            "route_distance_meters": round(sum(
+                haversine_meters(*a, *b) for a, b in zip(points, points[1:])), 1),
+            "route_raw_points": len(points)
+        }
+
+# Global track store instance
+track_store = TrackStore()
+
+# Global trip tracker instance
+trip_tracker = TripTracker()
@@ -92,6 +92,12 @@ export class VehicleService {
     const response = await apiClient.get(`/vehicles/${vehicleId}`);
     return response.data;
   }
+
+  static async getAvailable(start, end, category = null) {
+    const params = category ? { start, end, category } : { start, end };
+    const response = await apiClient.get('/vehicles/availability', { params });
+    return response.data;
+  }
 }
 
 export class LocationService {
@@ -112,8 +118,9 @@ export class BookingService {
     return response.data;
   }
 
-  static async getUserBookings() {
-    const response = await apiClient.get('/bookings');
+  static async getUserBookings(cursor = null, limit = 20) {
+    const params = cursor ? { limit, cursor } : { limit };
+    const response = await apiClient.get('/bookings', { params });
     return response.data;
   }
 
@@ -134,6 +141,11 @@ export class PricingService {
     return response.data;
   }
 
+  static async calculateMatrix(batchRequest) {
+    const response = await apiClient.post('/pricing/batch', batchRequest);
+    return response.data;
+  }
+
   static async validatePromo(code, bookingAmount) {
     const response = await apiClient.post('/promo/validate', {
       code,
@@ -154,8 +166,8 @@ export class ContentService {
     return response.data;
   }
 
-  static async getBlogPosts(limit = 10) {
-    const response = await apiClient.get(`/blog/posts?limit=${limit}`);
+  static async getBlogPosts(limit = 10, fields = 'title,excerpt,category,image_url,publish_date,read_time') {
+    const response = await apiClient.get('/blog/posts', { params: { limit, fields } });
     return response.data;
   }
 
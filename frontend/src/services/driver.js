@@ -40,6 +40,11 @@ export class DriverService {
     const response = await apiClient.put(`/bookings/${bookingId}/status`, statusData);
     return response.data;
   }
+
+  static async getEarningsSummary() {
+    const response = await apiClient.get('/drivers/earnings');
+    return response.data;
+  }
 }
 
 export class BookingService {
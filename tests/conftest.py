@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other by bare name, as they do when server.py is run from backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def mongo():
+    """Point the global Database at a fresh in-memory Motor stand-in"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from database import db
+
+    saved = db.client, db.db
+    db.client = mongomock_motor.AsyncMongoMockClient()
+    db.db = db.client.get_database("riide_test")
+    yield db
+    db.client, db.db = saved
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import decode_cursor, encode_cursor
+
+def test_cursor_round_trips_scalar_values():
+    values = [datetime(2024, 1, 1, 12, 30), "booking_1", 3, 2.5, None]
+    assert decode_cursor(encode_cursor(values), len(values)) == values
+
+@pytest.mark.parametrize("value", [{"$ne": None}, {"$gt": ""}, ["a", "b"]])
+def test_cursor_rejects_non_scalar_values(value):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(encode_cursor([value, "booking_1"]), 2)
+
+@pytest.mark.anyio
+async def test_bookings_endpoint_answers_400_for_operator_cursor(mongo):
+    import server
+    from auth import create_access_token
+    from benchmarks.asgi import call_asgi
+
+    await mongo.create_document("users", {"id": "user_1", "email": "rider@example.com",
+                                          "name": "Rider", "created_at": datetime.utcnow()})
+    token = create_access_token(data={"sub": "user_1"})
+    cursor = encode_cursor([{"$ne": None}, "booking_1"])
+
+    status, body = await call_asgi(server.app, "GET", "/api/bookings",
+                                   headers={"Authorization": f"Bearer {token}"},
+                                   params={"cursor": cursor})
+
+    assert status == 400
+    assert b"Invalid pagination cursor" in body
+
+@pytest.mark.anyio
+async def test_projected_pages_return_only_requested_fields(mongo):
+    start = datetime(2024, 1, 1)
+    await mongo.create_documents("bookings", [
+        {"id": f"booking_{i}", "user_id": "user_1", "pickup_date": "2030-01-01",
+         "created_at": start + timedelta(hours=i)}
+        for i in range(5)
+    ])
+
+    seen = []
+    cursor = None
+    while True:
+        page = await mongo.get_user_bookings("user_1", limit=2, cursor=cursor,
+                                             fields=("id", "pickup_date"))
+        for item in page["items"]:
+            assert set(item) == {"id", "pickup_date"}
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # Stripping the sort keys must not break the continuation token
+    assert seen == [f"booking_{i}" for i in reversed(range(5))]
@@ -0,0 +1,45 @@
+import pytest
+from pydantic import ValidationError
+
+from models import BatchPriceEstimateRequest, PaymentMethod
+from pricing import PricingEngine, PricingTable, PAYMENT_DISCOUNTS
+
+@pytest.fixture
+def engine():
+    engine = PricingEngine()
+    engine.table = PricingTable(
+        {"Premium": (85.0, 450.0), "SUV": (95.0, 520.0)},
+        {"childSeat": 15.0, "wifi": 10.0},
+        PAYMENT_DISCOUNTS
+    )
+    return engine
+
+@pytest.mark.parametrize("service_type", ["chauffeur", "rental"])
+@pytest.mark.parametrize("promo", [None, {"discount_percentage": 0.2}])
+def test_quote_matrix_matches_quote(engine, service_type, promo):
+    vehicle_types = ["Premium", "SUV"]
+    durations = [1, 3, 8]
+    payment_methods = list(PaymentMethod)
+    extras = ["childSeat", "wifi"]
+
+    matrix = engine.quote_matrix(vehicle_types, service_type, durations, extras=extras,
+                                 payment_methods=payment_methods, promo=promo)
+
+    for v, vehicle_type in enumerate(vehicle_types):
+        for d, duration in enumerate(durations):
+            for p, payment_method in enumerate(payment_methods):
+                expected = engine.quote(
+                    vehicle_type, service_type,
+                    duration_hours=duration if service_type == "chauffeur" else 1,
+                    duration_days=duration if service_type == "rental" else None,
+                    extras=extras, payment_method=payment_method, promo=promo
+                ).dict()
+                quote = matrix[v][d][p]
+                assert quote["breakdown"] == pytest.approx(expected.pop("breakdown"))
+                assert {k: quote[k] for k in expected} == pytest.approx(expected)
+
+@pytest.mark.parametrize("durations", [[-5], [0], list(range(1, 102))])
+def test_batch_request_rejects_bad_durations(durations):
+    with pytest.raises(ValidationError):
+        BatchPriceEstimateRequest(vehicle_types=["Premium"], service_type="rental",
+                                  durations=durations)
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import GPSFix
+from tracks import TrackStore
+
+def backlog(count: int = 90):
+    # Microseconds included on purpose: stored dates only keep milliseconds
+    start = datetime.utcnow().replace(microsecond=123456) - timedelta(hours=2)
+    return [GPSFix(lat=37.6, lng=-122.4 + i / 1000, recorded_at=start + timedelta(minutes=i))
+            for i in range(count)]
+
+async def stored_points(mongo, driver_id: str) -> int:
+    buckets = await mongo.db.driver_tracks.find({"driver_id": driver_id}).to_list(None)
+    return sum(bucket["count"] for bucket in buckets)
+
+@pytest.mark.anyio
+async def test_high_water_mark_is_seeded_from_storage(mongo):
+    fixes = backlog()
+    points, _ = await TrackStore().ingest("driver_1", fixes)
+    assert len(points) == len(fixes)
+
+    # A restarted process (or another worker) starts with no in-memory mark
+    points, dropped = await TrackStore().ingest("driver_1", fixes)
+
+    assert points == []
+    assert dropped == {"invalid": 0, "duplicates": 1, "out_of_order": len(fixes) - 1}
+    assert await stored_points(mongo, "driver_1") == len(fixes)
+
+@pytest.mark.anyio
+async def test_concurrent_uploads_of_one_backlog_are_stored_once(mongo):
+    fixes = backlog()
+    store = TrackStore()
+
+    results = await asyncio.gather(store.ingest("driver_1", fixes), store.ingest("driver_1", fixes))
+
+    assert sorted(len(points) for points, _ in results) == [0, len(fixes)]
+    assert await stored_points(mongo, "driver_1") == len(fixes)
+
+@pytest.mark.anyio
+async def test_newer_fixes_are_accepted_after_reload(mongo):
+    fixes = backlog()
+    await TrackStore().ingest("driver_1", fixes[:60])
+
+    points, _ = await TrackStore().ingest("driver_1", fixes)
+
+    assert len(points) == 30
+    assert await stored_points(mongo, "driver_1") == len(fixes)